@@ -5,9 +5,260 @@ import os.path
 import ctypes
 import tempfile
 import shutil
+import hashlib
+import atexit
+import threading
+import time
+import json
 
 StringLength = 1024
 
+# Names of the avrSWAP records used by the wrapper (1-based FORTRAN index), the other
+# records are named avrSWAP<index> in the debug log
+RecordNames = {
+    1: 'iStatus', 2: 'Time', 3: 'DT', 4: 'BlPitch1', 15: 'MeasuredPower', 20: 'GenSpeed',
+    21: 'RotSpeed', 23: 'GenTorque', 27: 'HorWindV', 28: 'IPCMode', 30: 'RootMOOP1',
+    31: 'RootMOOP2', 32: 'RootMOOP3', 33: 'BlPitch2', 34: 'BlPitch3', 42: 'PitCom1',
+    43: 'PitCom2', 44: 'PitCom3', 45: 'PitComCol', 47: 'GenTorqueDemand', 49: 'MsgLength',
+    50: 'InFileLength', 51: 'OutNameLength', 53: 'TowerFAAcc', 60: 'Azimuth', 61: 'NumBl',
+    83: 'NacNodAcc',
+}
+
+# Structured dtype of the swap array with one named float32 field per record, also the dtype
+# of the debug log (the reader in stephan_py.controller_log takes the names from the log)
+NumberOfRecords = 84
+SwapDtype = numpy.dtype([(RecordNames.get(i, 'avrSWAP{}'.format(i)), numpy.float32)
+                         for i in range(1, NumberOfRecords + 1)])
+
+# 0-based index of each named record in the swap array
+RecordIndex = dict((name, i) for i, name in enumerate(SwapDtype.names))
+
+# Records written at every step with one vector assignment, see BladedController.update
+StepInputRecords = numpy.array([RecordIndex[name] for name in [
+    'iStatus', 'MsgLength', 'NumBl', 'HorWindV', 'Azimuth', 'Time', 'DT', 'GenSpeed', 'RotSpeed',
+    'GenTorque', 'MeasuredPower', 'NacNodAcc', 'TowerFAAcc']])
+BladePitchRecords = numpy.array([RecordIndex[name] for name in ['BlPitch1', 'BlPitch2', 'BlPitch3']])
+
+# Outputs of the controller, held between the controller samples, see BladedController.holdOutputs
+OutputRecords = numpy.array([RecordIndex[name] for name in [
+    'PitCom1', 'PitCom2', 'PitCom3', 'PitComCol', 'GenTorqueDemand']])
+
+
+def privateInputFile(inputFileName, modelDirectory):
+    ''' Returns the name of a temporary copy of a ROSCO input file with a relative PerfFileName
+        made absolute (relative to the model directory), so the controller does not depend on the
+        current working directory. Returns None if the file has no relative PerfFileName. '''
+    with open(inputFileName) as f:
+        lines = f.readlines()
+
+    for i, line in enumerate(lines):
+        value, sep, comment = line.partition('!')
+        if sep and comment.split()[:1] == ['PerfFileName']:
+            perfFileName = value.strip().strip('"\'')
+            if os.path.isabs(perfFileName):
+                return None
+            perfFileName = os.path.join(modelDirectory, perfFileName)
+            if len(perfFileName) + 2 > StringLength:
+                raise Exception('PerfFileName too long for the controller: ' + perfFileName)
+            lines[i] = '"{}"      !{}'.format(perfFileName, comment)
+            break
+    else:
+        return None
+
+    with tempfile.NamedTemporaryFile('w', suffix='.IN', delete=False) as tmp:
+        tmp.writelines(lines)
+
+    return tmp.name
+
+
+def loadLibrary(fileName):
+    ''' Loads the controller library and returns its handle. The library is loaded with
+        LoadLibraryW (Windows) or dlopen (Linux) so it can be freed with freeLibrary before
+        a private copy of it is deleted. '''
+    if os.name == 'nt':
+        LoadLibrary = ctypes.windll.kernel32.LoadLibraryW
+        LoadLibrary.restype = ctypes.c_void_p
+        LoadLibrary.argtypes = (ctypes.c_wchar_p,)
+        handle = LoadLibrary(fileName)
+        if handle is None:
+            raise ctypes.WinError()
+        return handle
+    else:
+        # RTLD_LOCAL so that the symbols of private copies do not resolve to the first copy loaded
+        return ctypes.CDLL(fileName, mode=os.RTLD_NOW | os.RTLD_LOCAL)._handle
+
+
+def freeLibrary(handle):
+    if os.name == 'nt':
+        FreeLibrary = ctypes.windll.kernel32.FreeLibrary
+        FreeLibrary.restype = ctypes.c_bool
+        FreeLibrary.argtypes = (ctypes.c_void_p,)
+        FreeLibrary(handle)
+    else:
+        dlclose = ctypes.CDLL(None).dlclose
+        dlclose.restype = ctypes.c_int
+        dlclose.argtypes = (ctypes.c_void_p,)
+        dlclose(handle)
+
+
+class PrivateLibrary(object):
+    ''' Private copy of a controller library, with its handle while it is loaded '''
+
+    def __init__(self, key, fileName):
+        self.key = key
+        self.fileName = fileName
+        self.handle = None
+
+
+# Idle private copies of this process by content of the library (sha1), see acquirePrivateLibrary.
+# The batch folders have identical copies of the same library, these share the pool entries.
+LibraryPool = {}
+LibraryPoolLock = threading.Lock()
+LibraryHashes = {}
+
+
+def libraryKey(fileName):
+    ''' Returns the sha1 of a library file, cached by path, modification time and size '''
+    stat = os.stat(fileName)
+    statKey = (os.path.abspath(fileName), stat.st_mtime, stat.st_size)
+    with LibraryPoolLock:
+        key = LibraryHashes.get(statKey, None)
+    if key is None:
+        with open(fileName, 'rb') as f:
+            key = hashlib.sha1(f.read()).hexdigest()
+        with LibraryPoolLock:
+            LibraryHashes[statKey] = key
+    return key
+
+
+def acquirePrivateLibrary(fileName):
+    ''' Returns an idle private copy of the library from the pool of this process, or a new
+        copy if there is none. A copy from the pool may still be loaded (handle not None). '''
+    key = libraryKey(fileName)
+    with LibraryPoolLock:
+        idle = LibraryPool.get(key, None)
+        if idle:
+            return idle.pop()
+
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(fileName)[1], delete=False) as tmp:
+        privateFileName = tmp.name
+    shutil.copy2(fileName, privateFileName)
+    return PrivateLibrary(key, privateFileName)
+
+
+def releasePrivateLibrary(library, keepLoaded):
+    ''' Returns a private copy to the pool. It stays loaded only if keepLoaded, i.e. if the
+        controller starts again from its initial state at the first call (iStatus = 0) of the
+        next simulation, see the ControllerCanBeReset tag. '''
+    if not keepLoaded and library.handle is not None:
+        freeLibrary(library.handle)
+        library.handle = None
+    with LibraryPoolLock:
+        LibraryPool.setdefault(library.key, []).append(library)
+
+
+@atexit.register
+def clearLibraryPool():
+    ''' Frees and deletes all idle private copies of the process '''
+    with LibraryPoolLock:
+        libraries = [library for idle in LibraryPool.values() for library in idle]
+        LibraryPool.clear()
+    for library in libraries:
+        if library.handle is not None:
+            freeLibrary(library.handle)
+            library.handle = None
+        try:
+            os.remove(library.fileName)
+        except OSError:
+            pass
+
+
+def controllerLibraryName(fileName):
+    ''' On Linux, a ControllerDLL tag naming a .dll is taken to mean the .so built from the same
+        sources (e.g. libdiscon.dll -> libdiscon.so), so the same model runs on both platforms. '''
+    root, ext = os.path.splitext(fileName)
+    if os.name != 'nt' and ext.lower() == '.dll' and os.path.isfile(root + '.so'):
+        return root + '.so'
+    return fileName
+
+
+class DebugLog(object):
+    ''' Binary debug log of the avrSWAP array after each controller call, written as a .npy
+        file with a structured dtype naming the records (see RecordNames). Rows are collected in
+        a preallocated buffer and appended in chunks; the header is rewritten at each flush so the
+        file can be read (numpy.load, also with mmap_mode) while the simulation is running. '''
+
+    headerLength = 4096
+
+    def __init__(self, fileName, chunkSize=4096):
+        self.dtype = SwapDtype
+        self.buffer = numpy.zeros((chunkSize, NumberOfRecords), numpy.float32)
+        self.nBuffered = 0
+        self.nWritten = 0
+        self.file = open(fileName, 'wb')
+        self.writeHeader()
+
+    def writeHeader(self):
+        header = repr({'descr': numpy.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                       'shape': (self.nWritten,)}).encode('latin1')
+        # magic string, version 1.0, header length, header padded with spaces to a fixed length
+        header = header + b' ' * (self.headerLength - 8 - len(header) - 1) + b'\n'
+        self.file.seek(0)
+        self.file.write(numpy.lib.format.magic(1, 0) + numpy.uint16(len(header)).tobytes() + header)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, avrSwap):
+        self.buffer[self.nBuffered] = avrSwap
+        self.nBuffered += 1
+        if self.nBuffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.nBuffered > 0:
+            self.file.write(self.buffer[:self.nBuffered].tobytes())
+            self.nWritten += self.nBuffered
+            self.nBuffered = 0
+            self.writeHeader()
+            self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class Profile(object):
+    ''' Timing counters of the wrapper at every step, see the ProfileController tag. lap(name) adds the
+        time since the previous lap (or restart) to the counter name; the counters are written as JSON
+        at the end of the simulation. '''
+
+    names = ('inputs', 'time_history', 'dll', 'outputs', 'debug')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.counters = dict.fromkeys(self.names, 0.0)
+        self.steps = 0
+        self.calls = 0
+
+    def restart(self):
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.counters[name] += now - self.last
+        self.last = now
+
+    def write(self, fileName, modelFileName):
+        # wall_time from the creation of the controller to the end of the simulation
+        profile = {'model': modelFileName, 'steps': self.steps, 'calls': self.calls,
+                   'wall_time': time.perf_counter() - self.start}
+        for name in self.names:
+            profile[name + '_time'] = self.counters[name]
+        profile['wrapper_time'] = sum(self.counters.values())
+        with open(fileName, 'w') as f:
+            json.dump(profile, f, indent=1)
+
 
 def getBooleanTagValue(modelObject, name):
     value = modelObject.tags.get(name, None)
@@ -19,42 +270,53 @@ def getBooleanTagValue(modelObject, name):
         raise Exception('Unrecognised value for {}: {}'.format(name, value))
 
 
-class ActuatorState(object):
-
-    def __init__(self, x, xdot, xdotdot):
-        self.x = x
-        self.xdot = xdot
-        self.xdotdot = xdotdot
+def outputBaseName(info):
+    ''' Returns the path without extension of the debug and profile files of a simulation: the
+        ControllerOutputName tag of the turbine (relative to the model directory), set per case by
+        stephan_py.runner for the cases of a batch script that share one model file, else the
+        model file name '''
+    outputName = info.ModelObject.tags.get('ControllerOutputName', None)
+    if outputName:
+        return os.path.join(info.ModelDirectory, outputName)
+    return os.path.splitext(info.ModelFileName)[0]
 
 
 class Actuator(object):
+    ''' Second order pitch actuator (natural frequency omega, damping ratio gamma) for all blades,
+        advanced with one matrix product per step on preallocated arrays '''
 
-    def __init__(self, omega, gamma, dt):
+    def __init__(self, omega, gamma, dt, nBlades=3):
         self.omega = omega
         self.gamma = gamma
         self.dt = dt  # assumes contant time step
-        self.uprev = 0.0
-        # assume zero inital state (i.e. can not start from a half run sim)
-        self.prevState = ActuatorState(0.0, 0.0, 0.0)
         beta = math.sqrt(1.0 - gamma**2)
-        self.g = math.exp(-gamma * omega * dt) * math.sin(beta * omega * dt) / (beta * omega)
-        self.f = math.exp(-gamma * omega * dt) * (gamma * math.sin(beta * omega * dt) / beta + math.cos(beta * omega * dt))
+        g = math.exp(-gamma * omega * dt) * math.sin(beta * omega * dt) / (beta * omega)
+        f = math.exp(-gamma * omega * dt) * (gamma * math.sin(beta * omega * dt) / beta + math.cos(beta * omega * dt))
+        self.f, self.g = f, g
+        omegaSqr = omega**2
+        gamma2Omega = 2.0 * gamma * omega
+
+        # [x, xdot, xdotdot] = transition @ [xprev, xdotprev, udot, uprev], per blade
+        self.transition = numpy.array([
+            [f, g, 2.0 * gamma * (f - 1.0) / omega + dt - g, 1.0 - f],
+            [-g * omegaSqr, f - gamma2Omega * g, 1.0 - f, g * omegaSqr],
+            [(gamma2Omega * g - f) * omegaSqr, ((4.0 * gamma**2 - 1.0) * omegaSqr * g - gamma2Omega * f), omegaSqr * g,
+             -(gamma2Omega * g - f) * omegaSqr],
+        ])
+        # assume zero inital state (i.e. can not start from a half run sim)
+        self.inputs = numpy.zeros((4, nBlades))
+        self.state = numpy.zeros((3, nBlades))
 
     def output(self, input):
-        u = input
-        f, g = self.f, self.g
-        omegaSqr = self.omega**2
-        gamma2Omega = 2.0 * self.gamma * self.omega
-        xprev, xdotprev = self.prevState.x, self.prevState.xdot
-        udot = (u - self.uprev) / self.dt
-        state = ActuatorState(
-            f * xprev + g * xdotprev + (2.0 * self.gamma * (f - 1.0) / self.omega + self.dt - g) * udot + (1.0 - f) * self.uprev,
-            -g * omegaSqr * (xprev - self.uprev) + (f - gamma2Omega * g) * xdotprev + (1.0 - f) * udot,
-            (gamma2Omega * g - f) * omegaSqr * (xprev - self.uprev) + ((4.0 * self.gamma**2 - 1.0) * omegaSqr * g - gamma2Omega * f) * xdotprev + omegaSqr * g * udot
-        )
-        self.prevState = state
-        self.uprev = u
-        return state.x, state.xdot, state.xdotdot
+        ''' Advances the actuators with the demanded pitch input (scalar or one per blade) and
+            returns pitch, rate and acceleration per blade (views, valid until the next call) '''
+        inputs, state = self.inputs, self.state
+        inputs[0:2] = state[0:2]
+        numpy.subtract(input, inputs[3], out=inputs[2])
+        inputs[2] /= self.dt
+        numpy.dot(self.transition, inputs, out=state)
+        inputs[3] = input
+        return state[0], state[1], state[2]
 
 
 class BladedController(object):
@@ -68,6 +330,11 @@ class BladedController(object):
         
         self.periodNow = OrcFxAPI.Period(OrcFxAPI.pnInstantaneousValue)
 
+        # released by unloadDLL, also if __init__ fails
+        self.libHandle = None
+        self.privateLibrary = None
+        self.privateInputFileName = None
+
         def checkInitialPitch(initialPitch):
             if initialPitch != 0.0:
                 raise Exception(turbine.Name + ' initial blade pitch must be zero.')
@@ -80,6 +347,7 @@ class BladedController(object):
             checkInitialPitch(turbine.InitialPitch)
 
         self.DLLCanBeShared = getBooleanTagValue(turbine, 'ControllerDLLCanBeShared')
+        self.DLLCanBeReset = getBooleanTagValue(turbine, 'ControllerCanBeReset')
         self.useActuator = getBooleanTagValue(turbine, 'UseActuator')
         self.setCWDToModelDir = getBooleanTagValue(turbine, 'SetCWDToModelDir')
         self.lastupdateTime = -numpy.inf
@@ -93,10 +361,32 @@ class BladedController(object):
         #Initiate debug file
         self.printContrDebugFile = getBooleanTagValue(turbine, 'PrintDebugFile')
         
+        self.debugLog = None
         if self.printContrDebugFile:
-            self.DebugFilename = os.path.splitext(info.ModelFileName)[0] + "_Debug.txt"
+            self.DebugFilename = outputBaseName(info) + "_Debug.npy"
+
+        ''' ProfileController: time the wrapper at every step (gathering the inputs, the TimeHistory calls,
+            DISCON, the outputs and the debug file) and write the totals to <model>_ControllerProfile.json
+            at the end of the simulation, to tell the time spent in the wrapper from that of OrcaFlex.
+            Named as the debug file, see outputBaseName. '''
+        self.profile = None
+        if getBooleanTagValue(turbine, 'ProfileController'):
+            self.profile = Profile()
+            self.modelFileName = info.ModelFileName
+            self.profileFilename = outputBaseName(info) + "_ControllerProfile.json"
                 
         self.IPC = turbine.PitchControlMode
+
+        # Individual pitch: blade pitch and root out-of-plane moment of each blade, fetched
+        # with one GetMultipleTimeHistories call per step where the API has it
+        if self.IPC == "Individual":
+            bladeObjectExtras = [OrcFxAPI.oeTurbine(bladeNo) for bladeNo in (1, 2, 3)]
+            self.bladeVarNames = ['Blade pitch', 'Root connection Ey moment']
+            self.bladeObjectExtras = bladeObjectExtras
+            self.bladeSpecification = None
+            if hasattr(OrcFxAPI, 'GetMultipleTimeHistories'):
+                self.bladeSpecification = [OrcFxAPI.TimeHistorySpecification(turbine, varName, objectExtra)
+                                           for varName in self.bladeVarNames for objectExtra in bladeObjectExtras]
         
         
         print(self.filename)
@@ -105,11 +395,11 @@ class BladedController(object):
             This can be useful if the controller dll uses the current working directory to read a 
             file from a relative file path.
 
-            An example of this is the perf. file, used with the ROSCO control dll. In this case,
-            setCWDToModelDir can be True and the perf. file placed in the model directory.
+            The perf. file of the ROSCO control dll does not need this any more: a relative PerfFileName
+            is made absolute in a private copy of the input file (see privateInputFile).
 
-            HOWEVER, if running multiple simulations in batch, setCWDToModelDir should always be False. For the
-            ROSCO control dll, a full absolute path could be given for the perf. file in the input file. '''
+            HOWEVER, if running multiple simulations in batch, setCWDToModelDir should always be False, as the
+            working directory is shared by all models (and threads) of the process. '''
         if self.setCWDToModelDir:
             os.chdir(modelDirectory)
 
@@ -121,26 +411,47 @@ class BladedController(object):
             else:
                 raise Exception('Wrapper only tested for constant timestep.')
 
+        ''' ControllerSamplePeriod: the controller dll runs at this fixed sample period [s], a multiple of
+            the time step, instead of at every time step, as the controller of a real turbine does.
+            In between, the outputs are held (ControllerOutputHold = Zero, the default) or ramped from the
+            previous to the latest output over one sample period (Ramp, i.e. delayed by one sample).
+            The actuator still runs at every time step. '''
+        self.samplePeriod = self.dt
+        if turbine.tags.get('ControllerSamplePeriod', None) is not None:
+            self.samplePeriod = float(turbine.tags.ControllerSamplePeriod)
+            stepsPerSample = self.samplePeriod / self.dt
+            if round(stepsPerSample) < 1 or abs(stepsPerSample - round(stepsPerSample)) > 1e-6:
+                raise Exception(turbine.Name + ' ControllerSamplePeriod must be a multiple of the time step.')
+        self.outputHold = turbine.tags.get('ControllerOutputHold', 'Zero')
+        if self.outputHold not in ('Zero', 'Ramp'):
+            raise Exception('Unrecognised value for ControllerOutputHold: {}'.format(self.outputHold))
+        self.firstSampleTime = None
+        self.sampleTime = None
+        self.nextSampleTime = None
+        self.sampleCount = 0
+        self.outputs = numpy.zeros(len(OutputRecords))
+        self.outputsLast = numpy.zeros(len(OutputRecords))
+
         if self.useActuator:
             omega = float(turbine.tags.ActuatorOmega)
             gamma = float(turbine.tags.ActuatorGamma)
             self.actuator = Actuator(omega, gamma, self.dt)
 
-        DLLfileName = os.path.join(modelDirectory, turbine.tags.ControllerDLL)
-        if not self.DLLCanBeShared:
-            with tempfile.NamedTemporaryFile(suffix='.dll', delete=False) as tmp:
-                self.DLLfileName = tmp.name
-            shutil.copy2(DLLfileName, self.DLLfileName)
-            DLLfileName = self.DLLfileName
+        ''' If the dll can not be shared, a private copy of it is loaded. The copies are kept in a pool
+            of the process and used again by the next simulations, so a worker running a batch copies
+            the dll once. With ControllerCanBeReset the copy also stays loaded between simulations;
+            the dll must then start again from its initial state at the first call (iStatus = 0), as
+            the ROSCO dll built from 04 - ROSCO controller dev does. '''
+        DLLfileName = controllerLibraryName(os.path.join(modelDirectory, turbine.tags.ControllerDLL))
 
         try:
-            # load with ctypes.windll.kernel32.LoadLibraryW so we can use ctypes.windll.kernel32.FreeLibrary before we del the DLL
-            LoadLibrary = ctypes.windll.kernel32.LoadLibraryW
-            LoadLibrary.restype = ctypes.c_void_p
-            LoadLibrary.argtypes = (ctypes.c_wchar_p,)
-            self.libHandle = LoadLibrary(DLLfileName)
-            if self.libHandle is None:
-                raise ctypes.WinError()
+            if self.DLLCanBeShared:
+                self.libHandle = loadLibrary(DLLfileName)
+            else:
+                self.privateLibrary = acquirePrivateLibrary(DLLfileName)
+                if self.privateLibrary.handle is None:
+                    self.privateLibrary.handle = loadLibrary(self.privateLibrary.fileName)
+                self.libHandle = self.privateLibrary.handle
 
             self.dll = ctypes.CDLL('', handle=self.libHandle)
             self.DISCON = self.dll.DISCON
@@ -153,7 +464,10 @@ class BladedController(object):
                 ctypes.c_char_p
             )
 
-            self.avrSwap = numpy.zeros(84, numpy.float32)
+            # swap array, and views of the records read and written as a group
+            self.avrSwap = numpy.zeros(NumberOfRecords, numpy.float32)
+            self.rootMOOP = self.avrSwap[RecordIndex['RootMOOP1']:RecordIndex['RootMOOP3'] + 1]
+            self.pitCom = self.avrSwap[RecordIndex['PitCom1']:RecordIndex['PitCom3'] + 1]
             self.aviFail = ctypes.c_int()
 
             self.inputFileName = turbine.tags.get('InputFile', None)
@@ -161,6 +475,9 @@ class BladedController(object):
                 self.accInfile = (ctypes.c_char * StringLength)()
             else:
                 self.inputFileName = os.path.join(modelDirectory, turbine.tags.InputFile)
+                self.privateInputFileName = privateInputFile(self.inputFileName, modelDirectory)
+                if self.privateInputFileName is not None:
+                    self.inputFileName = self.privateInputFileName
                 self.accInfile = self.inputFileName.encode('utf-8')
 
             self.avcOutname = (ctypes.c_char * StringLength)()
@@ -170,18 +487,37 @@ class BladedController(object):
             raise
 
     def __del__(self):
-        if not self.firstCall:
+        self.close()
+
+    def close(self):
+        ''' Finalises the controller if it was called and unloads the DLL. Called by the Finalise of the
+            external functions, so the debug file and the profile are written when OrcaFlex finalises the
+            simulation (e.g. at Reset), not when the controller is garbage collected. Does nothing the
+            second time, as the pitch and torque controllers share the controller. '''
+        if self.libHandle is not None and not self.firstCall:
             self.finalise()
         self.unloadDLL()
 
     def unloadDLL(self):
-        if self.libHandle is not None:
-            FreeLibrary = ctypes.windll.kernel32.FreeLibrary
-            FreeLibrary.restype = ctypes.c_bool
-            FreeLibrary.argtypes = (ctypes.c_void_p,)
-            FreeLibrary(self.libHandle)
-        if not self.DLLCanBeShared:
-            os.remove(self.DLLfileName)
+        if self.privateLibrary is not None:
+            releasePrivateLibrary(self.privateLibrary, self.DLLCanBeReset)
+            self.privateLibrary = None
+        elif self.libHandle is not None:
+            freeLibrary(self.libHandle)
+        self.libHandle = None
+        if self.privateInputFileName is not None:
+            os.remove(self.privateInputFileName)
+            self.privateInputFileName = None
+
+    def bladeMeasurements(self, turbine):
+        ''' Returns the blade pitch angles [rad] and the absolute root out-of-plane (flapwise)
+            bending moments [Nm] of the three blades at the current time '''
+        if self.bladeSpecification is not None:
+            values = OrcFxAPI.GetMultipleTimeHistories(self.bladeSpecification, self.periodNow)[0]
+        else:
+            values = numpy.array([turbine.TimeHistory(varName, self.periodNow, objectExtra)[0]
+                                  for varName in self.bladeVarNames for objectExtra in self.bladeObjectExtras])
+        return numpy.radians(values[:3]), numpy.abs(values[3:]) * 1000.
 
     def getRecord(self, index):
         # convert between 1-based FORTRAN indexing and 0-based numpy indexing
@@ -192,7 +528,14 @@ class BladedController(object):
         self.avrSwap[index - 1] = value
 
     def callDLL(self):
+        if self.profile is not None:
+            self.profile.lap('inputs')
+            self.profile.calls += 1
+
         self.DISCON(self.avrSwap, self.aviFail, self.accInfile, self.avcOutname, self.avcMsg)
+
+        if self.profile is not None:
+            self.profile.lap('dll')
         
         # print to external output
         #print(self.avrSwap)
@@ -201,161 +544,150 @@ class BladedController(object):
         #print(self.avcOutname)
         #print(self.avcMsg)
 
-        #print swap array to text file
-        #print(self.DebugFilename)
-        if self.printContrDebugFile:
-            outF = open(self.DebugFilename, "a")
-            outF.writelines('\t'.join(["{:.8e}".format(x) for x in self.avrSwap]) + '\n')
-            outF.close()
+        # log swap array, see DebugLog
+        if self.debugLog is not None:
+            self.debugLog.append(self.avrSwap)
+            if self.profile is not None:
+                self.profile.lap('debug')
 
 
     def update(self, info):
         if info.NewTimeStep and info.SimulationTime > self.lastupdateTime:
         
             self.lastupdateTime = info.SimulationTime
+            simulationTime = info.SimulationTime - self.simulationStartTime
+            if self.profile is not None:
+                self.profile.restart()
+                self.profile.steps += 1
 
-            turbine = info.ModelObject
-            
-            def deg2rad(deg):
-            
-                return deg / 180.0 * numpy.pi
-            
-            
-            def IndividualBladePitch(blade_no):
-            
-                PitchAngle = info.ModelObject.TimeHistory(
-                'Blade pitch',  # this OrcaFlex result is the angle we want
-                self.periodNow,
-                OrcFxAPI.oeTurbine(blade_no)
-                )[0]  
-                
-                return deg2rad(PitchAngle)
-                
-            def IndividualRootBM(blade_no):
-            
-                RootBM = info.ModelObject.TimeHistory(
-                'Root connection Ey moment',  # flapwise bending moment
-                self.periodNow,
-                OrcFxAPI.oeTurbine(blade_no)
-                )[0] * 1000.  
-                
-                return abs(RootBM)
-
-            # iStatus
-            if self.firstCall:
-                self.torque = 0.0
-                self.setRecord(50, len(self.accInfile))
-                self.setRecord(51, StringLength)
-                self.setRecord(1, 0)
-                self.firstCall = False
-                
-                # Write debug file header to avoid ressetting during extraction
-                if self.printContrDebugFile:
-                    header = []
-                    for i in range(84):
-                        tmp_str = "avrSwap[" + str(i+1) + "]"
-                        header.append(tmp_str.ljust(15))
-                    outF = open(self.DebugFilename, "w")
-                    outF.writelines('\t'.join([x for x in header]) + '\n')
-                    outF.close()
-                
-            else:
-                self.setRecord(1, 1)
+            # call the controller at its sample instants only, see ControllerSamplePeriod
+            if self.nextSampleTime is None or simulationTime >= self.nextSampleTime - 1e-6 * self.dt:
+                self.sample(info, simulationTime)
 
-            # length of avcMsg character array
-            self.setRecord(49, StringLength)
+            self.holdOutputs(simulationTime)
+            if self.profile is not None:
+                self.profile.lap('outputs')
 
-            # number of blades
-            self.setRecord(61, info.InstantaneousCalculationData.BladeCount)
+    def sample(self, info, simulationTime):
+        ''' Calls the controller with the current measurements and keeps its outputs '''
+        turbine = info.ModelObject
 
-            # blade pitch            
-            if self.IPC == "Common":
-                pitch = info.InstantaneousCalculationData.BladePitchAngle
-                self.setRecord(4, pitch)
-                self.setRecord(33, pitch)
-                self.setRecord(34, pitch)
-                
-            elif self.IPC == "Individual":
-                #pitch = info.InstantaneousCalculationData.BladePitchAngle
-                pitch = [IndividualBladePitch(1),IndividualBladePitch(2),IndividualBladePitch(3)]
-                OutOfPlaneBM = [IndividualRootBM(1),IndividualRootBM(2),IndividualRootBM(3)]
-                # Set pitch
-                self.setRecord(4, pitch[0])
-                self.setRecord(33, pitch[1])
-                self.setRecord(34, pitch[2])
-                # Set BM
-                self.setRecord(30, OutOfPlaneBM[0])
-                self.setRecord(31, OutOfPlaneBM[1])
-                self.setRecord(32, OutOfPlaneBM[2])
-                # Set to individual in controller
-                self.setRecord(28, 1)
+        # iStatus
+        if self.firstCall:
+            self.torque = 0.0
+            self.avrSwap[RecordIndex['InFileLength']] = len(self.accInfile)
+            self.avrSwap[RecordIndex['OutNameLength']] = StringLength
+            status = 0
+            self.firstCall = False
             
+            # Start the debug file at the first call to avoid ressetting during extraction
+            if self.printContrDebugFile:
+                self.debugLog = DebugLog(self.DebugFilename)
+            
+        else:
+            status = 1
 
-            # horizontal hub wind speed
-            self.setRecord(27, info.InstantaneousCalculationData.HorizontalHubWindSpeed / self.velocityScaleFactor)
-
-            # rotor azimuth angle
-            self.setRecord(60, info.InstantaneousCalculationData.RotorAngle)
-
-            # time
-            self.setRecord(2, info.SimulationTime - self.simulationStartTime)
-
-            # time step
-            self.setRecord(3, self.dt)
-
-           # generator speed
-            self.setRecord(20, info.InstantaneousCalculationData.GeneratorAngVel)
-
-            # rotor speed
-            self.setRecord(21, info.InstantaneousCalculationData.MainShaftAngVel)
-
-            # torque and power
-            # DLL assumed to work in Nm
-            dllTorque =-self.torque * 1000.000 / self.momentScaleFactor
-            self.setRecord(23, dllTorque)
-            self.setRecord(15, dllTorque * info.InstantaneousCalculationData.GeneratorAngVel) # power not factored by efficiency
+        icd = info.InstantaneousCalculationData
 
-            # "nodding" acceleration
-            self.setRecord(83, -info.InstantaneousCalculationData.TurbineAngularAcceleration[1]) # -ve convert to FAST coordinate system
+        # blade pitch            
+        if self.IPC == "Common":
+            self.avrSwap[BladePitchRecords] = icd.BladePitchAngle
             
-            # tower "forward-aft" acceleration
-            self.setRecord(53, -info.InstantaneousCalculationData.TurbineAcceleration[2]) #  
+        elif self.IPC == "Individual":
+            #pitch = info.InstantaneousCalculationData.BladePitchAngle
+            if self.profile is not None:
+                self.profile.lap('inputs')
+            pitch, OutOfPlaneBM = self.bladeMeasurements(turbine)
+            if self.profile is not None:
+                self.profile.lap('time_history')
+            self.avrSwap[BladePitchRecords] = pitch
+            self.rootMOOP[:] = OutOfPlaneBM
+            # Set to individual in controller
+            self.avrSwap[RecordIndex['IPCMode']] = 1
+
+        # torque and power
+        # DLL assumed to work in Nm
+        dllTorque =-self.torque * 1000.000 / self.momentScaleFactor
+
+        # in the order of StepInputRecords
+        self.avrSwap[StepInputRecords] = (
+            status,
+            StringLength,  # length of avcMsg character array
+            icd.BladeCount,
+            icd.HorizontalHubWindSpeed / self.velocityScaleFactor,
+            icd.RotorAngle,
+            simulationTime,
+            self.samplePeriod,
+            icd.GeneratorAngVel,
+            icd.MainShaftAngVel,
+            dllTorque,
+            dllTorque * icd.GeneratorAngVel,  # power not factored by efficiency
+            -icd.TurbineAngularAcceleration[1],  # "nodding" acceleration, -ve convert to FAST coordinate system
+            -icd.TurbineAcceleration[2],  # tower "forward-aft" acceleration
+        )
 
-            # call DISCON
-            self.callDLL()
+        # call DISCON
+        self.callDLL()
 
-            if self.aviFail.value < 0:
-                raise Exception('Call to DISCON failed')
+        if self.aviFail.value < 0:
+            raise Exception('Call to DISCON failed')
+
+        # keep the outputs until the next sample
+        if self.firstSampleTime is None:
+            self.firstSampleTime = simulationTime
+            self.outputs[:] = self.avrSwap[OutputRecords]
+        self.outputsLast[:] = self.outputs
+        self.outputs[:] = self.avrSwap[OutputRecords]
+        self.sampleTime = simulationTime
+        self.sampleCount += 1
+        self.nextSampleTime = self.firstSampleTime + self.sampleCount * self.samplePeriod
+
+    def holdOutputs(self, simulationTime):
+        ''' Assigns the outputs of the last sample (ramped if ControllerOutputHold is Ramp) to the
+            state returned by the external functions, through the actuator if it is used '''
+        outputs = self.outputs
+        if self.outputHold == 'Ramp':
+            fraction = min(1.0, (simulationTime - self.sampleTime) / self.samplePeriod)
+            outputs = self.outputsLast + fraction * (self.outputs - self.outputsLast)
+
+        if self.IPC == "Common":
+            pitch = outputs[3]
+        elif self.IPC == "Individual":
+            # view of the blade pitch demands, valid until the next step
+            pitch = outputs[0:3]
 
-            # read output from DISCON and assign state to be returned by external functions
-            if self.useActuator:
-                # Not adapted to individual blade pitch 
-                self.pitch, self.pitchDot, self.pitchDotDot = self.actuator.output(self.getRecord(45))
-            else:
-                if self.IPC == "Common":
-                    self.pitch = self.getRecord(45)
-                    self.pitchDot = 0.0
-                    self.pitchDotDot = 0.0
-                elif self.IPC == "Individual":
-                    #self.pitch = [self.getRecord(42) self.getRecord(43) self.getRecord(44)]
-                    #self.pitch = self.getRecord(45)
-                    self.pitch = []
-                    self.pitch.append(self.getRecord(42))
-                    self.pitch.append(self.getRecord(43))
-                    self.pitch.append(self.getRecord(44))
-                    #print(pitch)
-                    self.pitchDot = 0.0
-                    self.pitchDotDot = 0.0
-            # DLL assumed to return value in Nm, first convert to OrcaFlex SI units (kN.m) and then to OrcaFlex model units
-            self.torque = -self.getRecord(47) / 1000.0 * self.momentScaleFactor
+        if self.useActuator:
+            pitch, pitchDot, pitchDotDot = self.actuator.output(pitch)
+            if self.IPC == "Common":
+                self.pitch, self.pitchDot, self.pitchDotDot = float(pitch[0]), float(pitchDot[0]), float(pitchDotDot[0])
+            elif self.IPC == "Individual":
+                self.pitch, self.pitchDot, self.pitchDotDot = pitch, pitchDot, pitchDotDot
+        else:
+            self.pitch = pitch
+            self.pitchDot = 0.0
+            self.pitchDotDot = 0.0
+        # DLL assumed to return value in Nm, first convert to OrcaFlex SI units (kN.m) and then to OrcaFlex model units
+        self.torque = -outputs[4] / 1000.0 * self.momentScaleFactor
             
 
     def finalise(self):
+        if self.profile is not None:
+            self.profile.restart()
+
         # iStatus
         self.setRecord(1, -1)
 
         # call DISCON
         self.callDLL()
+
+        if self.debugLog is not None:
+            self.debugLog.close()
+            self.debugLog = None
+
+        if self.profile is not None:
+            self.profile.lap('debug')
+            self.profile.write(self.profileFilename, self.modelFileName)
+            self.profile = None
         
 
 
@@ -368,7 +700,7 @@ class BaseController(object):
         
         
         # Stephan          
-        self.DebugFilename = os.path.splitext(info.ModelFileName)[0] + "_Debug.txt"
+        self.DebugFilename = outputBaseName(info) + "_Debug.npy"
         
         if controller is None:
             controller = BladedController(info)
@@ -383,6 +715,11 @@ class BaseController(object):
         key = info.ModelObject.handle.value
         if key in info.Workspace:
             del(info.Workspace[key])
+
+        controller = getattr(self, 'controller', None)
+        if controller is not None:
+            controller.close()
+            self.controller = None
             
 
     def Calculate(self, info):
@@ -420,6 +757,10 @@ class PitchController(BaseController):
                 info.StructValue[0].Value = 0.0
                 info.StructValue[1].Value = 0.0
                 info.StructValue[2].Value = 0.0        
+            if self.controller.useActuator and numpy.ndim(self.controller.pitchDot) == 1:
+                for i in range(3):
+                    info.StructValue[i].Velocity = self.controller.pitchDot[i]
+                    info.StructValue[i].Acceleration = self.controller.pitchDotDot[i]
         
         
         #info.StructValue.Velocity = self.controller.pitchDot
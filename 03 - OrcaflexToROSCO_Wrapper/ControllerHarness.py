@@ -0,0 +1,374 @@
+'''
+Closed-loop harness driving the BladedController wrapper with the real controller library,
+without OrcaFlex.
+
+The PitchController and TorqueController external functions of the wrapper are called
+with fake info objects, the plant is a rigid rotor using the Cp/Ct tables of the ROSCO
+perf. file and the drivetrain data of the ROSCO input file. Used to measure the wrapper
+overhead (steps per second and cost per phase) and to try controller variants in seconds.
+
+Example (Linux, libdiscon.so built from '04 - ROSCO controller dev/ROSCO-2.2.0'):
+
+    python ControllerHarness.py --library libdiscon.so --hours 1 --wind 12 --turbulence 0.1
+
+The ROSCO library writes its debug files (LoggingLevel) to the current working directory.
+'''
+import os
+import time
+import math
+import types
+import argparse
+import collections
+import importlib.util
+import numpy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WRAPPER = os.path.join(HERE, 'BladedControllerWrapper_20210627.py')
+DEFAULT_INPUT_FILE = os.path.join(HERE, '..', '02 - FOWT model', 'DISCON-UMaineSemi.IN')
+
+TimeHistorySpecification = collections.namedtuple('TimeHistorySpecification', ['modelObject', 'varName', 'objectExtra'])
+
+
+def GetMultipleTimeHistories(specification, period=None):
+    return numpy.array([[spec.modelObject.TimeHistory(spec.varName, period, spec.objectExtra)[0] for spec in specification]])
+
+
+# Names of the wrapper's OrcFxAPI global used by the wrapper, provided by the harness
+FakeOrcFxAPI = types.SimpleNamespace(
+    pnInstantaneousValue=0,
+    Period=lambda periodNumber: periodNumber,
+    oeTurbine=lambda bladeNumber: bladeNumber,
+    wrapped_ndpointer=numpy.ctypeslib.ndpointer,
+    TimeHistorySpecification=TimeHistorySpecification,
+    GetMultipleTimeHistories=GetMultipleTimeHistories,
+)
+
+PHASES = ['plant', 'wrapper', 'dll']
+
+
+def loadWrapper(fileName):
+    ''' Imports a controller wrapper file as a module, with the harness' OrcFxAPI names '''
+    spec = importlib.util.spec_from_file_location('BladedControllerWrapper', fileName)
+    module = importlib.util.module_from_spec(spec)
+    module.OrcFxAPI = FakeOrcFxAPI
+    spec.loader.exec_module(module)
+    return module
+
+
+def readInputFile(fileName):
+    ''' Returns the values of a ROSCO input file as a dict of name: list of strings '''
+    values = {}
+    with open(fileName) as f:
+        for line in f:
+            value, sep, comment = line.partition('!')
+            if sep and comment.split():
+                values[comment.split()[0]] = value.split()
+    return values
+
+
+def readPerfFile(fileName):
+    ''' Returns pitch [deg], TSR and the Cp, Ct and Cq tables (TSR x pitch) of a ROSCO perf. file '''
+    with open(fileName) as f:
+        lines = [line.strip() for line in f]
+
+    def vectorAfter(title):
+        i = next(i for i, line in enumerate(lines) if line.startswith('#') and title in line)
+        return numpy.array(lines[i + 1].split(), dtype=float)
+
+    def tableAfter(title, rows):
+        i = next(i for i, line in enumerate(lines) if line.startswith('#') and title in line) + 1
+        while not lines[i]:
+            i += 1
+        return numpy.array([line.split() for line in lines[i:i + rows]], dtype=float)
+
+    pitch = vectorAfter('Pitch angle vector')
+    tsr = vectorAfter('TSR vector')
+    return pitch, tsr, tableAfter('Power coefficient', len(tsr)), tableAfter('Thrust coefficient', len(tsr)), \
+        tableAfter('Torque coefficient', len(tsr))
+
+
+def interpolate(table, x, y, xi, yi):
+    ''' Bilinear interpolation in table (len(x) rows, len(y) columns), clipped to the table '''
+    xi = min(max(xi, x[0]), x[-1])
+    yi = min(max(yi, y[0]), y[-1])
+    i = min(max(numpy.searchsorted(x, xi) - 1, 0), len(x) - 2)
+    j = min(max(numpy.searchsorted(y, yi) - 1, 0), len(y) - 2)
+    u = (xi - x[i]) / (x[i + 1] - x[i])
+    v = (yi - y[j]) / (y[j + 1] - y[j])
+    return (1 - u) * (1 - v) * table[i, j] + u * (1 - v) * table[i + 1, j] + \
+        (1 - u) * v * table[i, j + 1] + u * v * table[i + 1, j + 1]
+
+
+def windFunction(meanSpeed, turbulence=0.0, seed=1, nComponents=20):
+    ''' Returns wind speed as a function of time: the mean speed plus a sum of sinusoids
+        between 0.005 and 0.5 Hz with a standard deviation of turbulence * meanSpeed '''
+    random = numpy.random.RandomState(seed)
+    frequencies = numpy.logspace(math.log10(0.005), math.log10(0.5), nComponents)
+    amplitudes = frequencies**(-5.0 / 6.0)
+    amplitudes *= turbulence * meanSpeed * math.sqrt(2.0) / math.sqrt((amplitudes**2).sum())
+    phases = random.uniform(0.0, 2.0 * math.pi, nComponents)
+
+    def wind(t):
+        return meanSpeed + float((amplitudes * numpy.sin(2.0 * math.pi * frequencies * t + phases)).sum())
+
+    return wind
+
+
+class Tags(dict):
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class Handle(object):
+
+    def __init__(self, value):
+        self.value = value
+
+
+class StructValue(object):
+
+    def __init__(self):
+        self.Value = 0.0
+        self.Velocity = 0.0
+        self.Acceleration = 0.0
+
+
+class InstantaneousCalculationData(object):
+
+    def __init__(self, bladeCount):
+        self.BladeCount = bladeCount
+        self.BladePitchAngle = 0.0
+        self.HorizontalHubWindSpeed = 0.0
+        self.RotorAngle = 0.0
+        self.GeneratorAngVel = 0.0
+        self.MainShaftAngVel = 0.0
+        self.TurbineAngularAcceleration = [0.0, 0.0, 0.0]
+        self.TurbineAcceleration = [0.0, 0.0, 0.0]
+
+
+class FakeTurbine(object):
+    ''' Turbine model object: tags, pitch control mode, unit conversion and the individual
+        blade results asked for with TimeHistory, taken from the plant '''
+
+    def __init__(self, tags, plant, pitchControlMode):
+        self.Name = 'Turbine1'
+        self.tags = Tags(tags)
+        self.handle = Handle(1)
+        self.plant = plant
+        self.PitchControlMode = pitchControlMode
+        self.InitialPitch = [0.0, 0.0, 0.0]
+
+    def DataNameValid(self, name):
+        return name == 'PitchControlMode'
+
+    def UnitsConversionFactor(self, units):
+        # model in SI units with kN
+        return 1.0
+
+    def TimeHistory(self, varName, period, objectExtra):
+        blade = objectExtra - 1
+        if varName == 'Blade pitch':
+            return numpy.array([math.degrees(self.plant.pitch[blade])])
+        elif varName == 'Root connection Ey moment':
+            return numpy.array([self.plant.rootMoment(blade) / 1000.0])
+        raise Exception('Result not available in the harness: ' + varName)
+
+
+class RigidRotorPlant(object):
+    ''' Rigid rotor with ideal pitch actuators: J dOmega/dt = Qaero - N Qgen, with the
+        aerodynamic torque and thrust from the Cp and Ct tables '''
+
+    def __init__(self, inputFileName, wind, shear=0.1):
+        values = readInputFile(inputFileName)
+        self.radius = float(values['WE_BladeRadius'][0])
+        self.gearboxRatio = float(values['WE_GearboxRatio'][0])
+        self.inertia = float(values['WE_Jtot'][0])
+        self.rho = float(values['WE_RhoAir'][0])
+        self.minPitch = float(values['PC_MinPit'][0])
+        self.maxPitch = float(values['PC_MaxPit'][0])
+        perfFileName = values['PerfFileName'][0].strip('"\'')
+        self.tablePitch, self.tableTSR, self.cp, self.ct, self.cq = readPerfFile(
+            os.path.join(os.path.dirname(inputFileName), perfFileName))
+
+        self.wind = wind
+        self.shear = shear
+        self.bladeCount = 3
+        self.pitch = [0.0] * self.bladeCount
+        self.azimuth = 0.0
+        self.windSpeed = wind(0.0)
+        # start at the optimal tip speed ratio, at most at rated speed
+        tsrOpt = self.tableTSR[numpy.argmax(self.cp[:, numpy.argmin(abs(self.tablePitch))])]
+        self.rotorSpeed = min(tsrOpt * self.windSpeed / self.radius, float(values['VS_RefSpd'][0]) / self.gearboxRatio)
+
+    def coefficient(self, table, pitch):
+        tsr = self.rotorSpeed * self.radius / max(self.windSpeed, 0.1)
+        return interpolate(table, self.tableTSR, self.tablePitch, tsr, math.degrees(pitch))
+
+    def rootMoment(self, blade):
+        ''' Out-of-plane root bending moment [Nm]: a third of the thrust at 2/3 of the radius,
+            varying with azimuth as from wind shear '''
+        thrust = 0.5 * self.rho * math.pi * self.radius**2 * self.windSpeed**2 * self.coefficient(self.ct, self.pitch[blade])
+        azimuth = self.azimuth + 2.0 * math.pi * blade / self.bladeCount
+        return thrust / self.bladeCount * 2.0 / 3.0 * self.radius * (1.0 + self.shear * math.cos(azimuth))
+
+    def step(self, t, dt, pitch, generatorTorque):
+        ''' Advances the rotor by dt with the pitch per blade [rad] and generator torque [Nm] '''
+        self.pitch = [min(max(p, self.minPitch), self.maxPitch) for p in pitch]
+        self.windSpeed = self.wind(t)
+        cp = sum(self.coefficient(self.cp, p) for p in self.pitch) / self.bladeCount
+        aeroPower = 0.5 * self.rho * math.pi * self.radius**2 * self.windSpeed**3 * cp
+        aeroTorque = aeroPower / max(self.rotorSpeed, 0.01)
+        self.rotorSpeed += dt * (aeroTorque - self.gearboxRatio * generatorTorque) / self.inertia
+        self.rotorSpeed = max(self.rotorSpeed, 0.0)
+        self.azimuth = (self.azimuth + dt * self.rotorSpeed) % (2.0 * math.pi)
+        return aeroPower
+
+
+class Harness(object):
+    ''' Steps the pitch and torque external functions of a wrapper module against a plant.
+        Call run(duration) and read the results from stats. '''
+
+    def __init__(self, wrapper, libraryFileName, inputFileName, plant, dt=0.05, individual=False,
+                 iterations=1, tags=None):
+        self.wrapper = wrapper
+        self.plant = plant
+        self.dt = dt
+        self.iterations = iterations
+        self.individual = individual
+        self.time = 0.0
+
+        turbineTags = {
+            'ControllerDLL': os.path.abspath(libraryFileName),
+            'InputFile': os.path.abspath(inputFileName),
+            'ControllerDLLCanBeShared': 'False',
+            'UseActuator': 'False',
+            'SetCWDToModelDir': 'False',
+            'PrintDebugFile': 'False',
+        }
+        turbineTags.update(tags or {})
+        self.turbine = FakeTurbine(turbineTags, plant, 'Individual' if individual else 'Common')
+
+        general = types.SimpleNamespace(DynamicsSolutionMethod='Implicit time domain',
+                                        ImplicitUseVariableTimeStep='No', ImplicitConstantTimeStep=dt)
+        self.model = types.SimpleNamespace(simulationStartTime=0.0, general=general)
+        self.icd = InstantaneousCalculationData(plant.bladeCount)
+        workspace = {}
+
+        def info(structValue):
+            return types.SimpleNamespace(
+                ModelObject=self.turbine, Model=self.model, ModelDirectory=os.path.dirname(os.path.abspath(inputFileName)),
+                ModelFileName=os.path.join(os.getcwd(), 'ControllerHarness.dat'), Workspace=workspace,
+                CanResumeSimulation=True, SimulationTime=0.0, NewTimeStep=True,
+                InstantaneousCalculationData=self.icd, StructValue=structValue, Value=0.0)
+
+        self.pitchInfo = info([StructValue() for i in range(plant.bladeCount)] if individual else StructValue())
+        self.torqueInfo = info(None)
+
+        self.pitchController = wrapper.PitchController()
+        self.torqueController = wrapper.TorqueController()
+        self.pitchController.Initialise(self.pitchInfo)
+        self.torqueController.Initialise(self.torqueInfo)
+        self.controller = self.pitchController.controller
+
+        # Time the library calls, the rest of the Calculate calls is wrapper overhead
+        self.stats = dict((phase, 0.0) for phase in PHASES)
+        DISCON = self.controller.DISCON
+
+        def timedDISCON(*args):
+            t0 = time.perf_counter()
+            DISCON(*args)
+            self.stats['dll'] += time.perf_counter() - t0
+
+        self.controller.DISCON = timedDISCON
+        self.stats.update(steps=0, simulatedTime=0.0, wallTime=0.0, energy=0.0)
+
+    def pitchDemand(self):
+        if self.individual:
+            return [structValue.Value for structValue in self.pitchInfo.StructValue]
+        return [self.pitchInfo.StructValue.Value] * self.plant.bladeCount
+
+    def step(self):
+        plant = self.plant
+        t0 = time.perf_counter()
+
+        # Plant response to the last controller outputs (torque in kN.m, sign as in OrcaFlex)
+        power = plant.step(self.time, self.dt, self.pitchDemand(), -self.torqueInfo.Value * 1000.0)
+        self.time += self.dt
+        icd = self.icd
+        icd.BladePitchAngle = plant.pitch[0]
+        icd.HorizontalHubWindSpeed = plant.windSpeed
+        icd.RotorAngle = plant.azimuth
+        icd.MainShaftAngVel = plant.rotorSpeed
+        icd.GeneratorAngVel = plant.rotorSpeed * plant.gearboxRatio
+        t1 = time.perf_counter()
+        dll = self.stats['dll']
+
+        # OrcaFlex calls the external functions once with NewTimeStep and again for each
+        # further iteration of the time step
+        for iteration in range(self.iterations):
+            for controller, info in [[self.pitchController, self.pitchInfo], [self.torqueController, self.torqueInfo]]:
+                info.SimulationTime = self.time
+                info.NewTimeStep = iteration == 0
+                controller.Calculate(info)
+        t2 = time.perf_counter()
+
+        self.stats['plant'] += t1 - t0
+        self.stats['wrapper'] += t2 - t1 - (self.stats['dll'] - dll)
+        self.stats['steps'] += 1
+        self.stats['energy'] += power * self.dt
+
+    def run(self, duration):
+        nSteps = int(round(duration / self.dt))
+        t0 = time.perf_counter()
+        for i in range(nSteps):
+            self.step()
+        self.stats['wallTime'] += time.perf_counter() - t0
+        self.stats['simulatedTime'] += nSteps * self.dt
+        return self.stats
+
+    def close(self):
+        self.pitchController.Finalise(self.pitchInfo)
+        self.torqueController.Finalise(self.torqueInfo)
+
+    def report(self):
+        stats = self.stats
+        lines = ['Steps: {}, simulated {:.0f} s in {:.2f} s wall time'.format(stats['steps'], stats['simulatedTime'], stats['wallTime']),
+                 'Steps per second: {:.0f}, real-time factor: {:.0f}'.format(stats['steps'] / stats['wallTime'],
+                                                                           stats['simulatedTime'] / stats['wallTime'])]
+        for phase in PHASES:
+            lines.append('  {:8s} {:8.2f} s {:8.1f} us/step {:5.1f} %'.format(
+                phase, stats[phase], stats[phase] / stats['steps'] * 1e6, stats[phase] / stats['wallTime'] * 100.0))
+        lines.append('Final rotor speed: {:.3f} rad/s, pitch: {:.2f} deg, mean aero power: {:.2f} MW'.format(
+            self.plant.rotorSpeed, math.degrees(self.plant.pitch[0]), stats['energy'] / stats['simulatedTime'] / 1e6))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Run the controller wrapper in closed loop with a rigid rotor, without OrcaFlex')
+    parser.add_argument('--library', required=True, help='controller library (e.g. libdiscon.so or libdiscon.dll)')
+    parser.add_argument('--input-file', default=DEFAULT_INPUT_FILE, help='ROSCO input file, also read for the rotor data and perf. file')
+    parser.add_argument('--wrapper', default=DEFAULT_WRAPPER, help='controller wrapper file')
+    parser.add_argument('--hours', type=float, default=1.0, help='simulated time [h]')
+    parser.add_argument('--dt', type=float, default=0.05, help='time step [s]')
+    parser.add_argument('--wind', type=float, default=12.0, help='mean wind speed [m/s]')
+    parser.add_argument('--turbulence', type=float, default=0.1, help='turbulence intensity [-]')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--individual', action='store_true', help='individual pitch control mode')
+    parser.add_argument('--iterations', type=int, default=1, help='Calculate calls per time step (implicit solver iterations)')
+    parser.add_argument('--tag', action='append', default=[], metavar='NAME=VALUE', help='turbine tag for the wrapper (can be repeated)')
+    args = parser.parse_args()
+
+    plant = RigidRotorPlant(args.input_file, windFunction(args.wind, args.turbulence, args.seed))
+    harness = Harness(loadWrapper(args.wrapper), args.library, args.input_file, plant, args.dt, args.individual,
+                      args.iterations, dict(tag.split('=', 1) for tag in args.tag))
+    try:
+        harness.run(args.hours * 3600.0)
+    finally:
+        harness.close()
+
+    print(harness.report())
@@ -0,0 +1,232 @@
+'''
+Offline replay of recorded controller inputs through the controller library, to screen
+controller tunings in seconds before running them in OrcaFlex.
+
+The input records of the debug log of the wrapper (<model>_Debug.npy, PrintDebugFile tag;
+<case>_Debug.npy for the batch script cases run by stephan_py.runner) are fed through the
+controller library for each variant of the ROSCO input file, and the commands of the variants
+are compared to the recorded ones. The replay is open loop: the measurements are those of the
+recorded simulation, whatever the variant commands.
+
+A variant is a ROSCO input file, or changes of the base input file given as
+'NAME=VALUE;NAME=VALUE' (NAME as in the comment of the input file, array values separated
+by spaces). The base input file is always replayed first; its commands must equal the
+recorded ones, which checks the replay. Debug files of the controller are switched off
+(LoggingLevel = 0) unless a variant sets LoggingLevel.
+
+Example (Linux, libdiscon.so built from '04 - ROSCO controller dev/ROSCO-2.2.0'):
+
+    python ControllerReplay.py --library libdiscon.so --log Model_Debug.npy --input-file DISCON-UMaineSemi.IN
+        --variant DISCON-alt1.IN --variant "PS_BldPitchMin_tbl=..." --workers 4 --output replay.npz
+'''
+import os
+import ctypes
+import argparse
+import tempfile
+import concurrent.futures
+import numpy
+
+import ControllerHarness
+
+# Records written by the wrapper (the controller inputs), copied from the log at every call
+InputNames = ['iStatus', 'Time', 'DT', 'BlPitch1', 'BlPitch2', 'BlPitch3', 'MeasuredPower', 'GenSpeed',
+              'RotSpeed', 'GenTorque', 'HorWindV', 'IPCMode', 'RootMOOP1', 'RootMOOP2', 'RootMOOP3',
+              'MsgLength', 'OutNameLength', 'TowerFAAcc', 'Azimuth', 'NumBl', 'NacNodAcc']
+
+# Commands of the controller kept for every call, in the order of the command histories
+CommandNames = ['PitCom1', 'PitCom2', 'PitCom3', 'PitComCol', 'GenTorqueDemand']
+
+# Wrapper module of this process, see replayVariant
+wrapper = None
+
+
+def variantInputFile(baseFileName, changes):
+    ''' Writes a temporary copy of a ROSCO input file with the values of changes (dict of name:
+        value string) and an absolute PerfFileName, and returns its name '''
+    changes = dict(changes)
+    changes.setdefault('LoggingLevel', '0')
+
+    with open(baseFileName) as f:
+        lines = f.readlines()
+
+    found = set()
+    for i, line in enumerate(lines):
+        value, sep, comment = line.partition('!')
+        name = comment.split()[0] if sep and comment.split() else None
+        if name in changes:
+            lines[i] = '{}      !{}'.format(changes[name], comment)
+            found.add(name)
+        elif name == 'PerfFileName':
+            perfFileName = value.strip().strip('"\'')
+            if not os.path.isabs(perfFileName):
+                perfFileName = os.path.join(os.path.dirname(os.path.abspath(baseFileName)), perfFileName)
+            lines[i] = '"{}"      !{}'.format(perfFileName, comment)
+
+    missing = set(changes) - found
+    if missing:
+        raise Exception('Not in {}: {}'.format(baseFileName, ', '.join(sorted(missing))))
+
+    with tempfile.NamedTemporaryFile('w', suffix='.IN', delete=False) as tmp:
+        tmp.writelines(lines)
+
+    return tmp.name
+
+
+def parseVariant(spec, baseFileName):
+    ''' Returns [name, input file, changes] of a variant given as a file or as NAME=VALUE;... '''
+    if os.path.isfile(spec):
+        return [os.path.basename(spec), spec, {}]
+
+    changes = {}
+    for change in spec.split(';'):
+        if change.strip():
+            name, sep, value = change.partition('=')
+            if not sep:
+                raise Exception('Variant is neither a file nor NAME=VALUE changes: {}'.format(spec))
+            changes[name.strip()] = value.strip()
+
+    return [spec, baseFileName, changes]
+
+
+def readLog(fileName):
+    ''' Returns the rows of a debug log (structured, see SwapDtype of the wrapper) as a float32
+        array of shape (calls, records), without the last call (iStatus = -1) '''
+    log = numpy.load(fileName)
+    records = numpy.ascontiguousarray(log).view(numpy.float32).reshape(len(log), -1)
+    return records[records[:, 0] >= 0]
+
+
+def loadWrapper(wrapperFileName):
+    ''' Returns the wrapper module of this process, for its library and swap array helpers '''
+    global wrapper
+    if wrapper is None:
+        wrapper = ControllerHarness.loadWrapper(wrapperFileName)
+    return wrapper
+
+
+def replayVariant(wrapperFileName, libraryFileName, logFileName, variant):
+    ''' Replays the recorded inputs of a debug log through the library with the input file of a
+        variant and returns its command histories, shape (calls, len(CommandNames)) '''
+    wrapper = loadWrapper(wrapperFileName)
+    records = readLog(logFileName)
+
+    name, baseFileName, changes = variant
+    inputIndex = numpy.array([wrapper.RecordIndex[recordName] for recordName in InputNames])
+    commandIndex = numpy.array([wrapper.RecordIndex[recordName] for recordName in CommandNames])
+
+    inputFileName = variantInputFile(baseFileName, changes)
+    handle = wrapper.loadLibrary(libraryFileName)
+    try:
+        DISCON = ctypes.CDLL('', handle=handle).DISCON
+        DISCON.restype = None
+        DISCON.argtypes = (numpy.ctypeslib.ndpointer(dtype=numpy.float32, ndim=1, flags='C_CONTIGUOUS'),
+                           ctypes.POINTER(ctypes.c_int), ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p)
+
+        accInfile = inputFileName.encode('utf-8')
+        avcOutname = (ctypes.c_char * wrapper.StringLength)()
+        avcMsg = (ctypes.c_char * wrapper.StringLength)()
+        aviFail = ctypes.c_int()
+
+        avrSwap = numpy.zeros(wrapper.NumberOfRecords, numpy.float32)
+        avrSwap[wrapper.RecordIndex['InFileLength']] = len(accInfile)
+        commands = numpy.zeros((len(records), len(CommandNames)))
+        for i, row in enumerate(records):
+            avrSwap[inputIndex] = row[inputIndex]
+            DISCON(avrSwap, aviFail, accInfile, avcOutname, avcMsg)
+            if aviFail.value < 0:
+                raise Exception('{}: call to DISCON failed at t = {} s: {}'.format(
+                    name, row[wrapper.RecordIndex['Time']], avcMsg.value.decode('utf-8', 'replace').strip()))
+            commands[i] = avrSwap[commandIndex]
+
+        avrSwap[wrapper.RecordIndex['iStatus']] = -1
+        DISCON(avrSwap, aviFail, accInfile, avcOutname, avcMsg)
+    finally:
+        # unloaded, so the next variant of this process starts from a freshly loaded library
+        wrapper.freeLibrary(handle)
+        os.remove(inputFileName)
+
+    return commands
+
+
+def metrics(wrapper, records, commands, recorded):
+    ''' Returns summary metrics of the command histories of a variant, recorded are the command
+        histories of the recorded simulation, wrapper is the wrapper module (see loadWrapper) '''
+    dt = records[:, wrapper.RecordIndex['DT']].astype(float)
+    genSpeed = records[:, wrapper.RecordIndex['GenSpeed']].astype(float)
+
+    pitch = numpy.degrees(commands[:, 0:3])
+    collectivePitch = pitch.mean(axis=1)
+    pitchRate = numpy.diff(pitch, axis=0) / dt[1:, None]
+    torque = commands[:, 4] / 1000.0
+
+    return {
+        'pitch_mean': collectivePitch.mean(),                                 # deg
+        'pitch_std': collectivePitch.std(),                                   # deg
+        'pitch_travel': numpy.abs(numpy.diff(pitch, axis=0)).sum(axis=0).mean(),  # deg per blade
+        'pitch_rate_max': numpy.abs(pitchRate).max() if len(pitchRate) else 0.0,  # deg/s
+        'torque_mean': torque.mean(),                                         # kNm
+        'torque_std': torque.std(),                                           # kNm
+        'power_mean': (commands[:, 4] * genSpeed).mean() / 1e6,              # MW, at the recorded speed
+        'pitch_change': numpy.sqrt(numpy.mean((pitch - numpy.degrees(recorded[:, 0:3]))**2)),  # deg rms
+        'torque_change': numpy.sqrt(numpy.mean((torque - recorded[:, 4] / 1000.0)**2)),      # kNm rms
+    }
+
+
+MetricColumns = [['pitch_mean', 'pitch mean', 'deg', '{:.2f}'], ['pitch_std', 'pitch std', 'deg', '{:.2f}'],
+                 ['pitch_travel', 'travel', 'deg', '{:.0f}'], ['pitch_rate_max', 'rate max', 'deg/s', '{:.2f}'],
+                 ['torque_mean', 'torque', 'kNm', '{:.0f}'], ['torque_std', 'torque std', 'kNm', '{:.0f}'],
+                 ['power_mean', 'power', 'MW', '{:.2f}'], ['pitch_change', 'd pitch', 'deg rms', '{:.3f}'],
+                 ['torque_change', 'd torque', 'kNm rms', '{:.1f}']]
+
+
+def report(names, results, nameLength=40):
+    ''' Returns the table of the metrics of all variants, long variant names are shortened '''
+    names = [name if len(name) <= nameLength else name[:nameLength - 3] + '...' for name in names]
+    width = max(len(name) for name in names + ['variant'])
+    lines = ['{:{}s}'.format('variant', width) + ''.join('{:>12s}'.format(title) for key, title, unit, fmt in MetricColumns),
+             '{:{}s}'.format('', width) + ''.join('{:>12s}'.format(unit) for key, title, unit, fmt in MetricColumns)]
+    for name, result in zip(names, results):
+        lines.append('{:{}s}'.format(name, width) + ''.join('{:>12s}'.format(fmt.format(result[key]))
+                                                            for key, title, unit, fmt in MetricColumns))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Replay the recorded controller inputs of a debug log through the controller library for variants of the ROSCO input file')
+    parser.add_argument('--library', required=True, help='controller library (e.g. libdiscon.so or libdiscon.dll)')
+    parser.add_argument('--log', required=True, help='debug log of the wrapper (<model>_Debug.npy)')
+    parser.add_argument('--input-file', default=ControllerHarness.DEFAULT_INPUT_FILE, help='ROSCO input file of the recorded simulation')
+    parser.add_argument('--variant', action='append', default=[], metavar='FILE|NAME=VALUE;...', help='ROSCO input file, or changes of --input-file (can be repeated)')
+    parser.add_argument('--wrapper', default=ControllerHarness.DEFAULT_WRAPPER, help='controller wrapper file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='number of worker processes')
+    parser.add_argument('--output', metavar='NPZ', help='save the command histories of all variants to this file')
+    args = parser.parse_args()
+
+    libraryFileName = os.path.abspath(args.library)
+    logFileName = os.path.abspath(args.log)
+    variants = [['base', args.input_file, {}]] + [parseVariant(spec, args.input_file) for spec in args.variant]
+    n = len(variants)
+
+    # the variants run in parallel in worker processes, one loaded library per process
+    if args.workers > 1 and n > 1:
+        with concurrent.futures.ProcessPoolExecutor(min(args.workers, n)) as executor:
+            histories = list(executor.map(replayVariant, [args.wrapper] * n, [libraryFileName] * n, [logFileName] * n, variants))
+    else:
+        histories = [replayVariant(args.wrapper, libraryFileName, logFileName, variant) for variant in variants]
+
+    wrapper = loadWrapper(args.wrapper)
+    records = readLog(logFileName)
+    recorded = records[:, [wrapper.RecordIndex[recordName] for recordName in CommandNames]].astype(float)
+    names = [variant[0] for variant in variants]
+    print(report(names, [metrics(wrapper, records, commands, recorded) for commands in histories]))
+
+    # the base replay must give the recorded commands, else the log is not of this library and input file
+    deviation = numpy.abs(histories[0] - recorded).max()
+    if deviation > 0.0:
+        print('Warning: the base replay differs from the recorded commands by up to {:g}, '
+              'the log was not recorded with this library and input file'.format(deviation))
+
+    if args.output is not None:
+        numpy.savez(args.output, Time=records[:, wrapper.RecordIndex['Time']], names=numpy.array(names),
+                    commandNames=numpy.array(CommandNames), commands=numpy.array(histories), recorded=recorded)
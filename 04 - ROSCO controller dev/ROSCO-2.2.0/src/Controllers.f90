@@ -50,6 +50,7 @@ CONTAINS
         REAL(C_FLOAT), INTENT(INOUT)    :: avrSWAP(*)   ! The swap array, used to pass data to, and receive data from the DLL controller.
         INTEGER(4)                      :: K            ! Index used for looping through blades.
         REAL(8), Save                :: PitComT_Last 
+        INTEGER(4), SAVE             :: PitComT_Simulation = 0     ! Simulation number PitComT_Last belongs to
 
         ! ------- Blade Pitch Controller --------
         ! Load PC State
@@ -106,6 +107,10 @@ CONTAINS
         ENDIF
 
         ! Saturate collective pitch commands:
+        IF (PitComT_Simulation /= SimulationNumber) THEN
+            PitComT_Last = 0.0
+            PitComT_Simulation = SimulationNumber
+        END IF
         LocalVar%PC_PitComT = saturate(LocalVar%PC_PitComT, LocalVar%PC_MinPit, CntrPar%PC_MaxPit)                    ! Saturate the overall command using the pitch angle limits
         LocalVar%PC_PitComT = ratelimit(LocalVar%PC_PitComT, PitComT_Last, CntrPar%PC_MinRat, CntrPar%PC_MaxRat, LocalVar%DT) ! Saturate the overall command of blade K using the pitch rate limit
         PitComT_Last = LocalVar%PC_PitComT
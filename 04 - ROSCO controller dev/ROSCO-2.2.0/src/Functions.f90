@@ -33,6 +33,10 @@ USE Filters
 
 IMPLICIT NONE
 
+! Number of the current simulation of this loaded library, incremented by DISCON at iStatus = 0.
+! Controllers with memory start again when it changes, so a loaded library can be reused.
+INTEGER(4) :: SimulationNumber = 0
+
 CONTAINS
 !-------------------------------------------------------------------------------------------------------------------------------
     REAL FUNCTION saturate(inputValue, minValue, maxValue)
@@ -85,14 +89,14 @@ CONTAINS
         REAL(8)                         :: PTerm                                        ! Proportional term
         REAL(8), DIMENSION(99), SAVE    :: ITerm = (/ (real(9999.9), i = 1,99) /)       ! Integral term, current.
         REAL(8), DIMENSION(99), SAVE    :: ITermLast = (/ (real(9999.9), i = 1,99) /)   ! Integral term, the last time this controller was called. Supports 99 separate instances.
-        INTEGER(4), DIMENSION(99), SAVE :: FirstCall = (/ (1, i=1,99) /)                ! First call of this function?
+        INTEGER(4), DIMENSION(99), SAVE :: FirstCall = (/ (0, i=1,99) /)                ! Simulation number of the last first call of this instance
         
         ! Initialize persistent variables/arrays, and set inital condition for integrator term
-        IF ((FirstCall(inst) == 1) .OR. reset) THEN
+        IF ((FirstCall(inst) /= SimulationNumber) .OR. reset) THEN
             ITerm(inst) = I0
             ITermLast(inst) = I0
             
-            FirstCall(inst) = 0
+            FirstCall(inst) = SimulationNumber
             PIController = I0
         ELSE
             PTerm = kp*error
@@ -130,16 +134,16 @@ CONTAINS
         REAL(8), DIMENSION(99), SAVE    :: ITermLast = (/ (real(9999.9), i = 1,99) /)   ! Integral term, the last time this controller was called. Supports 99 separate instances.
         REAL(8), DIMENSION(99), SAVE    :: ITerm2 = (/ (real(9999.9), i = 1,99) /)       ! Second Integral term, current.
         REAL(8), DIMENSION(99), SAVE    :: ITermLast2 = (/ (real(9999.9), i = 1,99) /)   ! Second Integral term, the last time this controller was called. Supports 99 separate instances.
-        INTEGER(4), DIMENSION(99), SAVE :: FirstCall = (/ (1, i=1,99) /)                ! First call of this function?
+        INTEGER(4), DIMENSION(99), SAVE :: FirstCall = (/ (0, i=1,99) /)                ! Simulation number of the last first call of this instance
         
         ! Initialize persistent variables/arrays, and set inital condition for integrator term
-        IF ((FirstCall(inst) == 1) .OR. reset) THEN
+        IF ((FirstCall(inst) /= SimulationNumber) .OR. reset) THEN
             ITerm(inst) = I0
             ITermLast(inst) = I0
             ITerm2(inst) = I0
             ITermLast2(inst) = I0
             
-            FirstCall(inst) = 0
+            FirstCall(inst) = SimulationNumber
             PIIController = I0
         ELSE
             PTerm = kp*error
@@ -342,12 +346,14 @@ CONTAINS
         INTEGER(4)                      :: i                                    ! Counter for making arrays
         REAL(8), DIMENSION(99), SAVE    :: errorLast = (/ (0, i=1,99) /)        ! 
         REAL(8), DIMENSION(99), SAVE    :: DFControllerLast = (/ (0, i=1,99) /) ! 
-        INTEGER(4), DIMENSION(99), SAVE :: FirstCall = (/ (1, i=1,99) /)        ! First call of this function?
+        INTEGER(4), DIMENSION(99), SAVE :: FirstCall = (/ (0, i=1,99) /)        ! Simulation number of the last first call of this instance
         
-        ! Initialize persistent variables/arrays, and set inital condition for integrator term
-        ! IF (FirstCall(inst) == 1) THEN
-            ! FirstCall(inst) = 0
-        ! END IF
+        ! Initialize persistent variables/arrays at the first call of a simulation
+        IF (FirstCall(inst) /= SimulationNumber) THEN
+            errorLast(inst) = 0.0
+            DFControllerLast(inst) = 0.0
+            FirstCall(inst) = SimulationNumber
+        END IF
         
         B = 2.0/DT
         DFController = (Kd*B)/(B*Tf+1.0)*error - (Kd*B)/(B*Tf+1.0)*errorLast(inst) - (1.0-B*Tf)/(B*Tf+1.0)*DFControllerLast(inst)
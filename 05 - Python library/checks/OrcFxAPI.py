@@ -0,0 +1,278 @@
+"""
+Stand-in for OrcFxAPI used by the checks in this folder, so the batch runner, the worker pool
+and the job server can be run without OrcaFlex or a licence. Only the parts used by stephan_py
+are there, with made-up results.
+
+A data file (.dat) is a text file of 'DataName: value' lines, stored as General data. The
+following data names control RunSimulation, also when changed by a batch script:
+
+    SimulationTime    simulated time [s], default 600
+    RunTime           wall-clock time of RunSimulation [s], default 0
+    FailRuns          number of runs that fail for this data file before it runs
+                      (counted in <data file name>_runs.txt next to the data file)
+    Fail              'Yes': every run fails
+    ControllerScript  Python external function file of the turbine controller (relative to the
+                      data file), e.g. BladedControllerWrapper_20210627.py
+
+The objects are General, Environment, '15MW RWT' (turbine) and Line1. Tags of the turbine can
+be given as 'Tag.Name: value' lines. With a ControllerScript, RunSimulation calls the
+PitchController and TorqueController external functions of the script at every time step, as
+OrcaFlex does, and Reset finalises them, so the controller wrapper writes its debug file and
+profile as in OrcaFlex. The controller DLL (ControllerDLL tag) must then export DISCON.
+"""
+import os
+import sys
+import time
+import types
+import importlib.util
+import numpy as np
+
+rtTimeHistory = 1
+pnInstantaneousValue = -1
+
+# Samples per simulated second of the time histories, also the time steps of the external functions
+SAMPLE_RATE = 10
+
+# Modules of the controller scripts by path, loaded once per process as OrcaFlex does
+SCRIPTS = {}
+
+# Names of this module used by the controller wrapper
+wrapped_ndpointer = np.ctypeslib.ndpointer
+
+
+class DLLError(Exception):
+    pass
+
+
+class ObjectExtra(object):
+
+    def __init__(self, kind, *args):
+        self.kind = kind
+        self.args = args
+
+    def __repr__(self):
+        return 'ObjectExtra({!r}, {})'.format(self.kind, ', '.join(repr(arg) for arg in self.args))
+
+
+oeEndA = ObjectExtra('EndA')
+oeEndB = ObjectExtra('EndB')
+
+
+def oeTurbine(BladeIndex):
+    return ObjectExtra('Turbine', BladeIndex)
+
+
+def oeTurbineEndB(BladeIndex):
+    return ObjectExtra('TurbineEndB', BladeIndex)
+
+
+def oeVessel(x, y, z):
+    return ObjectExtra('Vessel', x, y, z)
+
+
+class Period(object):
+
+    def __init__(self, *args):
+        self.args = args
+
+
+def SpecifiedPeriod(FromTime, ToTime):
+    return Period(FromTime, ToTime)
+
+
+class TimeHistorySpecification(object):
+
+    def __init__(self, modelObject, varName, objectExtra=None):
+        self.modelObject = modelObject
+        self.varName = varName
+        self.objectExtra = objectExtra
+
+
+class VarDetails(object):
+
+    def __init__(self, VarName, VarUnits):
+        self.VarName = VarName
+        self.VarUnits = VarUnits
+
+
+# Time history variables of the objects: name, units
+VARIABLES = {
+    'General': [['Time', 's']],
+    'Environment': [['Elevation', 'm'], ['Wind speed', 'm/s']],
+    '15MW RWT': [['Blade pitch', 'deg'], ['Root connection Ex moment', 'kN.m'], ['Root connection Ey moment', 'kN.m'],
+                 ['Root connection Ez moment', 'kN.m'], ['Generator torque', 'kN.m'], ['Rotor ang. vel.', 'rpm'],
+                 ['Generator power (96.55%)', 'kW'], ['Rotor aero Lz force', 'kN']],
+    'Line1': [['Effective tension', 'kN'], ['x bend moment', 'kN.m'], ['y bend moment', 'kN.m']],
+}
+
+
+class Tags(dict):
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class OrcaFlexObject(object):
+
+    def __init__(self, model, name):
+        self.model = model
+        self.Name = name
+        self.handle = types.SimpleNamespace(value=id(self))
+        self.data = {}
+        self.tags = Tags()
+
+        # turbine data read by the controller wrapper
+        self.PitchControlMode = 'Common'
+        self.InitialPitch = [0.0, 0.0, 0.0]
+
+        # general data read by the controller wrapper
+        self.DynamicsSolutionMethod = 'Implicit time domain'
+        self.ImplicitUseVariableTimeStep = 'No'
+        self.ImplicitConstantTimeStep = 1.0 / SAMPLE_RATE
+
+    def GetData(self, dataName, index):
+        return self.data.get((dataName, index))
+
+    def SetData(self, dataName, index, value):
+        self.data[(dataName, index)] = value
+
+    def DataNameValid(self, dataName):
+        return True
+
+    def UnitsConversionFactor(self, units):
+        return 1.0
+
+    def varDetails(self, resultType, objectExtra=None):
+        return [VarDetails(name, units) for name, units in VARIABLES[self.Name]]
+
+    def TimeHistory(self, varName, period=None, objectExtra=None):
+        names = [name for name, units in VARIABLES[self.Name]]
+        if varName not in names:
+            raise DLLError('Unknown variable {} of {}'.format(varName, self.Name))
+        t = self.model.SampleTimes(period)
+        return (names.index(varName) + 1.0 + np.sin(0.1 * t)).astype(np.float32)
+
+
+def GetMultipleTimeHistories(specification, period=None):
+    return np.array([spec.modelObject.TimeHistory(spec.varName, period, spec.objectExtra)
+                     for spec in specification]).T
+
+
+class Model(object):
+
+    def __init__(self, filename=None):
+        self.objects = [OrcaFlexObject(self, name) for name in VARIABLES]
+        self.filename = None
+        self.general = self['General']
+        self.simulationStartTime = 0.0
+        self.workspace = {}
+        self.externalFunctions = []
+        self.finalisedExternalFunctions = []
+        if filename is not None:
+            self.LoadData(filename)
+
+    def __getitem__(self, name):
+        for model_object in self.objects:
+            if model_object.Name == name:
+                return model_object
+        raise DLLError('Unknown object {}'.format(name))
+
+    def LoadData(self, filename):
+        self.filename = os.path.abspath(filename)
+        general = self['General']
+        turbine = self['15MW RWT']
+        general.data = {('SimulationTime', -1): 600.0, ('RunTime', -1): 0.0}
+        turbine.tags = Tags()
+        with open(filename) as f:
+            for line in f:
+                name, sep, value = line.partition(':')
+                if not sep or line.lstrip().startswith('#'):
+                    continue
+                name, value = name.strip(), value.strip()
+                if name.startswith('Tag.'):
+                    turbine.tags[name[4:]] = value
+                else:
+                    general.data[(name, -1)] = value
+
+    def _General(self, dataName, default=None):
+        value = self['General'].GetData(dataName, -1)
+        return default if value is None else value
+
+    @property
+    def simulationStopTime(self):
+        return float(self._General('SimulationTime'))
+
+    def RunSimulation(self):
+        time.sleep(float(self._General('RunTime')))
+
+        if self._General('Fail') == 'Yes':
+            raise DLLError('Simulation failed ({})'.format(self.filename))
+
+        fail_runs = int(self._General('FailRuns', 0))
+        if fail_runs:
+            runs_path = os.path.splitext(self.filename)[0] + '_runs.txt'
+            runs = int(open(runs_path).read()) if os.path.isfile(runs_path) else 0
+            with open(runs_path, 'w') as f:
+                f.write(str(runs + 1))
+            if runs < fail_runs:
+                raise DLLError('Simulation failed, run {} of {}'.format(runs + 1, self.filename))
+
+        script = self._General('ControllerScript')
+        if script is not None:
+            self._RunExternalFunctions(os.path.join(os.path.dirname(self.filename), script))
+
+    def _RunExternalFunctions(self, script):
+        if script not in SCRIPTS:
+            spec = importlib.util.spec_from_file_location('ControllerScript{}'.format(len(SCRIPTS)), script)
+            module = importlib.util.module_from_spec(spec)
+            module.OrcFxAPI = sys.modules[__name__]
+            spec.loader.exec_module(module)
+            SCRIPTS[script] = module
+        module = SCRIPTS[script]
+        self.finalisedExternalFunctions = []
+
+        turbine = self['15MW RWT']
+        icd = types.SimpleNamespace(BladeCount=3, BladePitchAngle=0.0, HorizontalHubWindSpeed=10.0, RotorAngle=0.0,
+                                    GeneratorAngVel=1.0, MainShaftAngVel=1.0,
+                                    TurbineAngularAcceleration=[0.0, 0.0, 0.0], TurbineAcceleration=[0.0, 0.0, 0.0])
+        for class_name in ['PitchController', 'TorqueController']:
+            info = types.SimpleNamespace(
+                ModelObject=turbine, Model=self, ModelDirectory=os.path.dirname(self.filename),
+                ModelFileName=self.filename, Workspace=self.workspace, CanResumeSimulation=True,
+                SimulationTime=self.simulationStartTime, NewTimeStep=True, InstantaneousCalculationData=icd,
+                StructValue=types.SimpleNamespace(Value=0.0, Velocity=0.0, Acceleration=0.0), Value=0.0)
+            external_function = getattr(module, class_name)()
+            self.externalFunctions.append([external_function, info])
+            external_function.Initialise(info)
+
+        for t in self.SampleTimes()[1:]:
+            for external_function, info in self.externalFunctions:
+                info.SimulationTime = t
+                external_function.Calculate(info)
+
+    def SaveSimulation(self, filename):
+        with open(filename, 'w') as f:
+            f.write('fake simulation of {}\n'.format(self.filename))
+
+    def SaveData(self, filename):
+        self.SaveSimulation(filename)
+
+    def Reset(self):
+        # Finalises the external functions of the simulation that was run
+        external_functions, self.externalFunctions = self.externalFunctions, []
+        for external_function, info in external_functions:
+            external_function.Finalise(info)
+
+        # Released only at the next run, as OrcaFlex does not release them at once either: the
+        # controller wrapper must not rely on garbage collection to write its files
+        self.finalisedExternalFunctions = external_functions
+
+    def SampleTimes(self, period=None):
+        if period is not None and len(period.args) == 2:
+            start, stop = period.args
+        else:
+            start, stop = 0.0, self.simulationStopTime
+        return np.arange(int(round((stop - start) * SAMPLE_RATE)) + 1) / SAMPLE_RATE + start
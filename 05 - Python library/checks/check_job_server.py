@@ -0,0 +1,117 @@
+"""
+Check of the job server with worker clients on localhost, run without OrcaFlex against the
+stand-in OrcFxAPI of this folder:
+
+    python checks/check_job_server.py    (from '05 - Python library')
+
+A first client is killed while it runs the slow case, so the server gets no more heartbeats
+for it and must re-queue the case. A second client then runs all cases, which must end done.
+"""
+import os
+import sys
+import time
+import signal
+import shutil
+import functools
+import tempfile
+import threading
+import multiprocessing
+
+CHECKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# The stand-in OrcFxAPI before any installed one, also for the worker processes
+sys.path[0:0] = [CHECKS_FOLDER, os.path.dirname(CHECKS_FOLDER)]
+os.environ['PYTHONPATH'] = os.pathsep.join([CHECKS_FOLDER, os.path.dirname(CHECKS_FOLDER), os.environ.get('PYTHONPATH', '')])
+
+from stephan_py import runner
+from stephan_py import manifest as mf
+from stephan_py import telemetry as tm
+from stephan_py import extraction as ex
+from stephan_py import job_server as js
+from check_pool import WriteCase, WriteExtractionDefs, Check
+
+# Heartbeat timeout of the server and heartbeat interval of the clients [s]
+HEARTBEAT_TIMEOUT = 2.0
+HEARTBEAT_INTERVAL = 0.5
+
+
+def RunClient(address):
+
+    # Own process group, so the client can be killed together with its worker process
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    client = js.JobClient(address, runner.run_spec, 1, heartbeat_interval=HEARTBEAT_INTERVAL, poll_interval=0.2)
+    client.run()
+
+
+def KillClient(process):
+
+    if hasattr(os, 'killpg'):
+        os.killpg(process.pid, signal.SIGKILL)
+    else:
+        process.kill()
+    process.join()
+
+
+def main():
+
+    folder = tempfile.mkdtemp(prefix='check_job_server_')
+    try:
+        WriteCase(folder, '00001_U4.dat', SimulationTime=60, RunTime=3)
+        WriteCase(folder, '00002_U6.dat', SimulationTime=60)
+        WriteCase(folder, '00003_U8.dat', SimulationTime=60)
+        extraction = [ex.LoadExtractionDefs(WriteExtractionDefs(folder)), [0.0, 60.0]]
+
+        manifest = mf.Manifest(folder)
+        run = tm.NewRunId()
+        specs = {}
+        for file_name in ['00001_U4.dat', '00002_U6.dat', '00003_U8.dat']:
+            specs[file_name] = {'file_name': file_name, 'folder': folder, 'case': None,
+                                'extraction': extraction, 'keep_sim': False}
+
+        server = js.JobServer(host='127.0.0.1', port=0, retries=1, backoff=0.0, heartbeat_timeout=HEARTBEAT_TIMEOUT)
+        serving = threading.Thread(target=server.run, args=(
+            [[key, spec, None] for key, spec in specs.items()],
+            functools.partial(runner.remote_job_done, manifest, specs, run),
+            functools.partial(runner.job_failed, manifest, run)))
+        serving.start()
+
+        # The first client takes the slow case (the first job) and is killed while running it
+        first = multiprocessing.Process(target=RunClient, args=(server.address,))
+        first.start()
+        deadline = time.time() + 30.0
+        while True:
+            with server.lock:
+                if server.jobs['00001_U4.dat']['state'] == 'running':
+                    break
+            if time.time() > deadline:
+                raise Exception('The first client did not start the slow case')
+            time.sleep(0.1)
+        KillClient(first)
+        print('Killed the first client while running 00001_U4.dat')
+
+        second = multiprocessing.Process(target=RunClient, args=(server.address,))
+        second.start()
+        serving.join(60.0)
+        second.join(30.0)
+        Check(not serving.is_alive() and not second.is_alive(), 'server and second client finished')
+
+        manifest = mf.Manifest(folder)
+        status = {key: job['status'] for key, job in manifest.jobs.items()}
+        Check(status == {key: 'done' for key in specs}, 'job states {}'.format(status))
+        Check(all(os.path.isfile(os.path.join(folder, os.path.splitext(key)[0] + '_res.npz')) for key in specs),
+              'result files')
+
+        events = tm.ReadEvents(os.path.join(folder, tm.TELEMETRY_NAME))
+        lost = [e for e in events if e['status'] == 'retry']
+        Check(len(lost) == 1 and lost[0]['job'] == '00001_U4.dat' and 'no heartbeat' in lost[0]['error'],
+              'lost heartbeat re-queued: {}'.format([[e['job'], e['error']] for e in lost]))
+        Check('3 done, 0 failed, 1 retries' in tm.Report(events), 'throughput report')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print('All checks passed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Check of the batch runner with worker processes, timeouts, retries and quarantine, run
+without OrcaFlex against the stand-in OrcFxAPI of this folder:
+
+    python checks/check_pool.py          (from '05 - Python library')
+
+A temporary batch folder gets four cases: one that runs, one that fails once and runs when
+retried, one that times out and one that always fails. The last two must end quarantined.
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+CHECKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# The stand-in OrcFxAPI before any installed one, also for the worker processes
+sys.path[0:0] = [CHECKS_FOLDER, os.path.dirname(CHECKS_FOLDER)]
+os.environ['PYTHONPATH'] = os.pathsep.join([CHECKS_FOLDER, os.path.dirname(CHECKS_FOLDER), os.environ.get('PYTHONPATH', '')])
+
+from stephan_py import runner
+from stephan_py import extraction as ex
+from stephan_py import manifest as mf
+from stephan_py import telemetry as tm
+
+# Extraction definitions of the checks, GenVariableName: [OrcFxVariableName, object_name, objectExtra]
+EXTRACTION_DEFS = {
+    'RootMyb1': ['Root connection Ex moment', '15MW RWT', 'OrcFxAPI.oeTurbine(1)'],
+    'BldPitch1': ['Blade pitch', '15MW RWT', 'OrcFxAPI.oeTurbine(1)'],
+    'FairTen1': ['Effective tension', 'Line1', 'OrcFxAPI.oeEndA'],
+}
+
+
+def WriteCase(folder, file_name, **data):
+    """
+    Function writes a data file of the stand-in OrcFxAPI (DataName: value lines)
+    """
+
+    with open(os.path.join(folder, file_name), 'w') as f:
+        for name, value in data.items():
+            f.write('{}: {}\n'.format(name, value))
+
+
+def WriteExtractionDefs(folder):
+    """
+    Function writes EXTRACTION_DEFS to extraction_defs.json in a folder and returns its path
+    """
+
+    file_path = os.path.join(folder, 'extraction_defs.json')
+    with open(file_path, 'w') as f:
+        json.dump(EXTRACTION_DEFS, f, indent=4)
+
+    return file_path
+
+
+def Check(condition, message):
+
+    if not condition:
+        raise Exception('Check failed: ' + message)
+    print('ok   ', message)
+
+
+def main():
+
+    folder = tempfile.mkdtemp(prefix='check_pool_')
+    try:
+        WriteCase(folder, '00001_U4.dat', SimulationTime=60)
+        WriteCase(folder, '00002_U6.dat', SimulationTime=60, FailRuns=1)
+        WriteCase(folder, '00003_U8.dat', SimulationTime=60, RunTime=30)
+        WriteCase(folder, '00004_U10.dat', SimulationTime=60, Fail='Yes')
+        defs_path = WriteExtractionDefs(folder)
+
+        runner.main([folder, '--workers', '2', '--timeout', '2', '--retries', '1', '--backoff', '0.1',
+                     '--extract', defs_path])
+
+        manifest = mf.Manifest(folder)
+        status = {key: job['status'] for key, job in manifest.jobs.items()}
+        Check(status == {'00001_U4.dat': 'done', '00002_U6.dat': 'done',
+                         '00003_U8.dat': 'quarantined', '00004_U10.dat': 'quarantined'}, 'job states {}'.format(status))
+        Check('Timeout' in manifest.jobs['00003_U8.dat']['error'], 'timeout: ' + manifest.jobs['00003_U8.dat']['error'])
+        Check('Simulation failed' in manifest.jobs['00004_U10.dat']['error'], 'failure: ' + manifest.jobs['00004_U10.dat']['error'])
+
+        with open(os.path.join(folder, mf.QUARANTINE_NAME)) as f:
+            quarantine = json.load(f)
+        Check(sorted(quarantine) == ['00003_U8.dat', '00004_U10.dat'], 'quarantine list')
+
+        results = ex.LoadResults(os.path.join(folder, '00002_U6_res.npz'))
+        Check(results['TH'].shape == (len(EXTRACTION_DEFS), 6001), 'extracted result of the retried job')
+        Check(not os.path.isfile(os.path.join(folder, '00002_U6.sim')), 'no .sim file without --keep-sim')
+
+        events = tm.ReadEvents(os.path.join(folder, tm.TELEMETRY_NAME))
+        retries = sorted(e['job'] for e in events if e['status'] == 'retry')
+        Check(retries == ['00002_U6.dat', '00003_U8.dat', '00004_U10.dat'], 'retried jobs {}'.format(retries))
+        report = tm.Report(events)
+        Check('2 done, 2 failed, 3 retries' in report, 'throughput report')
+
+        # A second run runs no job: the done jobs are up to date and the quarantined ones skipped
+        runner.main([folder, '--workers', '2', '--extract', defs_path])
+        Check(len(tm.ReadEvents(os.path.join(folder, tm.TELEMETRY_NAME))) == len(events), 'second run runs no job')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print('All checks passed')
+
+
+if __name__ == '__main__':
+    main()
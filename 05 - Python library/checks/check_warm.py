@@ -0,0 +1,104 @@
+"""
+Check of the controller wrapper profiles of warm cases (load cases of a batch script run from
+their base model), run without OrcaFlex against the stand-in OrcFxAPI of this folder:
+
+    python checks/check_warm.py          (from '05 - Python library')
+
+The cases share the file name of the base model, so each case must get its own profile
+(<case>_ControllerProfile.json) and debug file (<case>_Debug.npy), written by the controller
+wrapper of '03 - OrcaflexToROSCO_Wrapper' when the simulation is reset, and its telemetry event
+must hold its own profile. The wrapper runs a stub DISCON, built with the C compiler (cc, or
+the CC environment variable).
+"""
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+CHECKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# The stand-in OrcFxAPI before any installed one, also for the worker processes
+sys.path[0:0] = [CHECKS_FOLDER, os.path.dirname(CHECKS_FOLDER)]
+os.environ['PYTHONPATH'] = os.pathsep.join([CHECKS_FOLDER, os.path.dirname(CHECKS_FOLDER), os.environ.get('PYTHONPATH', '')])
+
+from stephan_py import runner
+from stephan_py import telemetry as tm
+from check_pool import WriteCase, Check
+
+WRAPPER = os.path.join(os.path.dirname(os.path.dirname(CHECKS_FOLDER)), '03 - OrcaflexToROSCO_Wrapper',
+                       'BladedControllerWrapper_20210627.py')
+
+# Controller library with constant demands, enough for the wrapper
+STUB_DISCON = """
+#ifdef _WIN32
+__declspec(dllexport)
+#endif
+void DISCON(float *avrSWAP, int *aviFail, const char *accINFILE, char *avcOUTNAME, char *avcMSG)
+{
+    avrSWAP[44] = 0.0f;       /* PitComCol */
+    avrSWAP[46] = 1000.0f;    /* GenTorqueDemand */
+    *aviFail = 0;
+}
+"""
+
+BATCH_SCRIPT = """LoadData 'Base_model.dat'
+Select General
+SimulationTime = 60
+SaveData '00001_U4.dat'
+
+LoadData 'Base_model.dat'
+Select General
+SimulationTime = 120
+SaveData '00002_U6.dat'
+"""
+
+
+def BuildStubDISCON(folder):
+    """
+    Function builds STUB_DISCON in a folder and returns the file name of the library
+    """
+
+    with open(os.path.join(folder, 'discon_stub.c'), 'w') as f:
+        f.write(STUB_DISCON)
+    library_name = 'discon_stub.dll' if os.name == 'nt' else 'discon_stub.so'
+    subprocess.check_call([os.environ.get('CC', 'cc'), '-shared', '-fPIC', '-o', library_name, 'discon_stub.c'],
+                          cwd=folder)
+
+    return library_name
+
+
+def main():
+
+    folder = tempfile.mkdtemp(prefix='check_warm_')
+    try:
+        WriteCase(folder, 'Base_model.dat', ControllerScript=WRAPPER,
+                  **{'Tag.ControllerDLL': BuildStubDISCON(folder), 'Tag.ProfileController': 'True',
+                     'Tag.PrintDebugFile': 'True'})
+        with open(os.path.join(folder, 'check_rev01_1.txt'), 'w') as f:
+            f.write(BATCH_SCRIPT)
+
+        # One worker, so both cases run from the same base model in the same process
+        runner.main([folder, '--script', 'check_rev01_1.txt', '--workers', '1'])
+
+        # 0.1 s time steps, the wrapper calls the controller from 10 s on and once more to finalise it
+        for case_name, simulation_time in [['00001_U4', 60], ['00002_U6', 120]]:
+            Check(os.path.isfile(os.path.join(folder, case_name + tm.CONTROLLER_PROFILE_SUFFIX)),
+                  'profile of ' + case_name)
+            debug = np.load(os.path.join(folder, case_name + '_Debug.npy'))
+            Check(len(debug) == (simulation_time - 10) * 10 + 1, 'debug file of {} ({} calls)'.format(case_name, len(debug)))
+        Check(not os.path.isfile(os.path.join(folder, 'Base_model' + tm.CONTROLLER_PROFILE_SUFFIX)),
+              'no profile named after the base model')
+
+        events = sorted(tm.ReadEvents(os.path.join(folder, tm.TELEMETRY_NAME)), key=lambda e: e['job'])
+        steps = [e['controller']['steps'] if e['controller'] is not None else None for e in events]
+        Check(steps == [500, 1100], 'profiles in the telemetry events, steps {}'.format(steps))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print('All checks passed')
+
+
+if __name__ == '__main__':
+    main()
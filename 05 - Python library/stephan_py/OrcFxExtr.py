@@ -1,10 +1,42 @@
 """
 This module contains plot functions used in the project
 """
+import weakref
 import OrcFxAPI
-import statistics as stat
+import numpy as np
 
-# Extract time history
+from . import extraction as ex
+
+# Variable name: unit dictionaries of the OrcaFlex objects, by id of the object and then by
+# object extra (None for the object extra of the first lookup)
+_var_units = {}
+
+
+def _VarUnit(OrcFxobject, variableName, objectExtra):
+
+    # Unit of a time history variable, with the details of an object queried once and dropped
+    # with the object (or not kept when the object has no weak references). A variable not in the
+    # details of the first lookup is looked up with its own objectExtra, as in extraction.CheckModel.
+    key = id(OrcFxobject)
+    if key not in _var_units:
+        try:
+            weakref.finalize(OrcFxobject, _var_units.pop, key, None)
+            _var_units[key] = {}
+        except TypeError:
+            pass
+    details = _var_units.get(key, {})
+
+    for detail_key in [None, str(objectExtra)]:
+        if detail_key not in details:
+            var_details = OrcFxobject.varDetails(OrcFxAPI.rtTimeHistory, objectExtra)
+            details[detail_key] = {detail.VarName: detail.VarUnits for detail in var_details}
+        if variableName in details[detail_key]:
+            return details[detail_key][variableName]
+
+    raise Exception('Unknown variable {} of {}'.format(variableName, OrcFxobject.Name))
+
+
+# Extract time history, fetched on first use, statistics computed in one pass on first use
 class TH(object):
     
     def __init__(self, OrcFxobject, variableName, period, objectExtra):
@@ -12,32 +44,42 @@ class TH(object):
         self.variableName = variableName
         self.period = period
         self.objectExtra = objectExtra
-        self.THvalues = self.OrcFxobject.TimeHistory(self.variableName, self.period, self.objectExtra)
-        self.var_details = self.OrcFxobject.varDetails(OrcFxAPI.rtTimeHistory, self.objectExtra)
+        self._THvalues = None
+        self._stats = None
+        
+    @property
+    def THvalues(self):
+        if self._THvalues is None:
+            self._THvalues = self.OrcFxobject.TimeHistory(self.variableName, self.period, self.objectExtra)
+        return self._THvalues
+    
+    @property
+    def stats(self):
+        if self._stats is None:
+            values = ex.ChannelStats(np.asarray(self.THvalues)[np.newaxis, :])[0]
+            self._stats = dict(zip(ex.STAT_NAMES, values.tolist()))
+        return self._stats
         
     def getTH(self):
         return self.THvalues
     
     def getUnit(self):
-        for j in range(len(self.var_details)):
-            if self.var_details[j].VarName == self.variableName:
-                unit = self.var_details[j].VarUnits
-        return unit
+        return _VarUnit(self.OrcFxobject, self.variableName, self.objectExtra)
     
     def getTHmax(self):
-        return max(self.THvalues)
+        return self.stats['Max']
     
     def getTHmin(self):
-        return min(self.THvalues)
+        return self.stats['Min']
     
     def getTHavg(self):
-        return sum(self.THvalues)/len(self.THvalues)
+        return self.stats['Average']
     
     def getTHabsmax(self):
-        return max(abs(self.getTHmax()), abs(self.getTHmin()))
+        return self.stats['Abs max']
     
     def getTHstddev(self):
-        return stat.stdev(self.THvalues)
+        return self.stats['std. dev']
         
         
 # Extract Rainflow half-cycles
@@ -6,4 +6,16 @@ from . import plot
 from . import calc_functions
 from . import OrcFxExtr
 from . import dfs
+from . import manifest
+from . import extraction
+from . import store
+from . import series
+from . import batch_script
+from . import schedule
+from . import telemetry
+from . import process_pool
+from . import job_server
+from . import selection
+from . import controller_log
+from . import runner
 
@@ -0,0 +1,7 @@
+"""
+Batch runner: python -m stephan_py <batch folder> [options], see stephan_py.runner
+"""
+from stephan_py import runner
+
+if __name__ == '__main__':
+    runner.main()
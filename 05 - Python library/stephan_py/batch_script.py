@@ -0,0 +1,151 @@
+"""
+This module contains functions reading OrcaFlex batch scripts and applying their
+data changes to a model held in memory
+"""
+import os
+import glob
+
+# Batch scripts written by the load case generator, e.g. 203_rev01_1.txt
+BATCH_SCRIPT_PATTERN = '*_rev*_1.txt'
+
+
+def _ParseValue(value):
+
+    # Strip quotes and convert to int or float where possible
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '\'"':
+        return value[1:-1]
+
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+
+    return value
+
+
+def _ParseName(name, file_path, line_no):
+
+    # 'WaveName[1]' -> ('WaveName', 0), 'WaveHs' -> ('WaveHs', -1)
+    name = name.strip()
+    try:
+        if name.endswith(']'):
+            data_name, index = name[:-1].split('[')
+            return data_name.strip(), int(index) - 1
+    except ValueError:
+        raise Exception('Invalid data name in {}, line {}: {}'.format(file_path, line_no, name))
+
+    return name, -1
+
+
+def ReadBatchScript(file_path):
+    """
+    Function returns the load cases of a batch script as a list of dicts with
+    'LoadData' (base model), 'SaveData' (case file name), 'LoadCase' (1-based number) and
+    'Overrides', a list of [object_name, data_name, index, value] applied in order
+    (index is 0-based, -1 if not indexed).
+
+    A load case starts at LoadData and ends at SaveData or SaveSimulation. RunStatics and
+    RunDynamics are accepted and ignored as every case is run by the batch runner.
+    """
+
+    cases = []
+    case = None
+    object_name = 'General'
+
+    with open(file_path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if line == '' or line.startswith('//'):
+                continue
+
+            command, _, argument = line.partition(' ')
+            command = command.lower()
+
+            if command == 'loaddata':
+                case = {'LoadData': _ParseValue(argument), 'SaveData': None,
+                        'LoadCase': len(cases) + 1, 'Overrides': []}
+                object_name = 'General'
+            elif case is None:
+                raise Exception('{}, line {}: LoadData expected before: {}'.format(file_path, line_no, line))
+            elif command in ('savedata', 'savesimulation'):
+                case['SaveData'] = _ParseValue(argument)
+                cases.append(case)
+                case = None
+            elif command == 'select':
+                object_name = _ParseValue(argument)
+            elif command in ('runstatics', 'rundynamics'):
+                pass
+            elif '=' in line:
+                name, _, value = line.partition('=')
+                data_name, index = _ParseName(name, file_path, line_no)
+                case['Overrides'].append([object_name, data_name, index, _ParseValue(value)])
+            else:
+                raise Exception('{}, line {}: unrecognised batch script line: {}'.format(file_path, line_no, line))
+
+    if case is not None:
+        raise Exception('{}: last load case is not saved (SaveData missing)'.format(file_path))
+
+    return cases
+
+
+def ScriptJobs(file_path):
+    """
+    Function returns the load cases of a batch script as job specs for the batch runner:
+    dicts with 'folder' (folder of the script), 'name' (case name without extension),
+    'base' (absolute path of the base model) and the load case itself as 'case'.
+    No .dat file is written for the cases.
+    """
+
+    folder = os.path.dirname(os.path.abspath(file_path))
+
+    jobs = []
+    for case in ReadBatchScript(file_path):
+        jobs.append({
+            'folder': folder,
+            'name': os.path.splitext(case['SaveData'])[0],
+            'base': os.path.join(folder, case['LoadData']),
+            'case': case,
+        })
+
+    return jobs
+
+
+def CasesInFolder(folder):
+    """
+    Function returns a dict of SaveData file name: load case for all batch scripts in a folder.
+    Later scripts (e.g. rev02) replace cases with the same name in earlier ones.
+    """
+
+    cases = {}
+    for file_path in sorted(glob.glob(os.path.join(folder, BATCH_SCRIPT_PATTERN))):
+        for case in ReadBatchScript(file_path):
+            cases[case['SaveData']] = case
+
+    return cases
+
+
+def ApplyOverrides(model, overrides):
+    """
+    Function applies data changes to a model in reset state and returns the
+    previous values, to be passed to RestoreOverrides
+    """
+
+    undo = []
+    for object_name, data_name, index, value in overrides:
+        model_object = model[object_name]
+        undo.append([object_name, data_name, index, model_object.GetData(data_name, index)])
+        model_object.SetData(data_name, index, value)
+
+    return undo
+
+
+def RestoreOverrides(model, undo):
+    """
+    Function restores the values returned by ApplyOverrides, in reverse order so that
+    data depending on earlier changes (e.g. WindType) is restored first
+    """
+
+    for object_name, data_name, index, value in reversed(undo):
+        model[object_name].SetData(data_name, index, value)
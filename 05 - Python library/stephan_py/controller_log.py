@@ -0,0 +1,52 @@
+"""
+This module contains functions reading the binary controller debug logs written by the
+controller wrapper (PrintDebugFile tag), <case>_Debug.npy
+
+The record names are stored in the log itself (the wrapper's SwapDtype), so logs of
+wrapper versions with other named records are read the same way.
+"""
+import numpy as np
+import pandas as pd
+
+
+def ReadControllerLog(file_path, mmap=True):
+    """
+    Function returns a controller debug log as a structured array with one row per controller
+    call and one field per avrSWAP record, e.g. log['GenSpeed'] or log['avrSWAP84'].
+    With mmap the file is memory mapped instead of read, so only the used records are loaded.
+    """
+
+    return np.load(file_path, mmap_mode='r' if mmap else None)
+
+
+def ControllerLogRecords(log):
+    """
+    Function returns the record names of a controller debug log in avrSWAP order
+    """
+
+    return list(log.dtype.names)
+
+
+def BladeRecords(log, name):
+    """
+    Function returns the per-blade records name1..name3 of a controller debug log as an
+    array (calls x 3), e.g. BladeRecords(log, 'BlPitch'), 'RootMOOP' or 'PitCom'
+    """
+
+    return np.stack([np.asarray(log['{}{}'.format(name, blade)]) for blade in (1, 2, 3)], axis=1)
+
+
+def ControllerLogToDataFrame(log, records=None):
+    """
+    Function returns (the given records of) a controller debug log as a DataFrame indexed by time
+    """
+
+    if isinstance(log, str):
+        log = ReadControllerLog(log)
+    if records is None:
+        records = ControllerLogRecords(log)
+
+    df = pd.DataFrame({record: np.asarray(log[record]) for record in records})
+    df.index = np.asarray(log['Time'])
+
+    return df
@@ -0,0 +1,248 @@
+"""
+This module contains functions extracting results from a model held in memory
+"""
+import ast
+import json
+import numpy as np
+import OrcFxAPI
+
+# Statistics stored for every extracted variable, same order as the stat value csv files
+STAT_NAMES = ['Average', 'Max', 'Min', 'Abs max', 'std. dev']
+
+
+# Compiled extraction definitions of this process, by json text of the definitions
+_plans = {}
+
+
+def LoadExtractionDefs(file_path):
+    """
+    Function returns the extraction definitions from a json file (e.g. extraction_defs.json),
+    checked with CompileExtractionDefs
+    """
+
+    with open(file_path) as json_file:
+        extraction_data = json.load(json_file)
+
+    CompileExtractionDefs(extraction_data)
+
+    return extraction_data
+
+
+def _Number(node, text):
+
+    # Number argument of an object extra, e.g. 1, 0.0 or -2.5
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _Number(node.operand, text)
+        return -value if isinstance(node.op, ast.USub) else value
+
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+
+    raise Exception('Only numbers are allowed as object extra arguments: {}'.format(text))
+
+
+def ParseObjectExtra(text):
+    """
+    Function returns the object extra of an extraction definition, written as 'None',
+    'OrcFxAPI.oeEndA' or an OrcFxAPI.oe* call with number arguments, e.g. 'OrcFxAPI.oeTurbine(1)'
+    or 'OrcFxAPI.oeVessel(0.0, 0.0, 0.0)'. The text is parsed, not evaluated.
+    """
+
+    try:
+        node = ast.parse(text.strip(), mode='eval').body
+    except SyntaxError:
+        raise Exception('Invalid object extra: {}'.format(text))
+
+    if isinstance(node, ast.Constant) and node.value is None:
+        return None
+
+    func = node.func if isinstance(node, ast.Call) else node
+    if not (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == 'OrcFxAPI'
+            and func.attr.startswith('oe') and hasattr(OrcFxAPI, func.attr)):
+        raise Exception('Object extra is not None or an OrcFxAPI.oe* name: {}'.format(text))
+
+    if not isinstance(node, ast.Call):
+        return getattr(OrcFxAPI, func.attr)
+
+    args = [_Number(arg, text) for arg in node.args]
+    kwargs = {keyword.arg: _Number(keyword.value, text) for keyword in node.keywords}
+    return getattr(OrcFxAPI, func.attr)(*args, **kwargs)
+
+
+def CompileExtractionDefs(extraction_data):
+    """
+    Function checks extraction definitions and returns them compiled, with the object extras
+    parsed once (see ParseObjectExtra). The compiled definitions are kept for this process, so
+    they are only compiled once for all models extracted with the same definitions.
+
+    Parameters
+    ----------
+    extraction_data : dict
+        GenVariableName: [OrcFxVariableName, object_name, objectExtra]
+
+    Returns
+    -------
+    dict
+        names (GenVariableNames), channels ([OrcFxVariableName, object_name, objectExtra text,
+        object extra] per name) and units (None until checked against a model, see CheckModel)
+    """
+
+    key = json.dumps(extraction_data)
+    if key in _plans:
+        return _plans[key]
+
+    if not isinstance(extraction_data, dict) or not extraction_data:
+        raise Exception('Extraction definitions must be a non-empty dict of GenVariableName: definition')
+
+    channels = []
+    for name, definition in extraction_data.items():
+        if not (isinstance(definition, (list, tuple)) and len(definition) == 3
+                and all(isinstance(item, str) for item in definition)):
+            raise Exception('Extraction definition of {} is not [OrcFxVariableName, object_name, objectExtra]: {}'.format(
+                name, definition))
+        OrcFxVariableName, object_name, objectExtra = definition
+        channels.append([OrcFxVariableName, object_name, objectExtra, ParseObjectExtra(objectExtra)])
+
+    _plans[key] = {'names': list(extraction_data.keys()), 'channels': channels, 'units': None}
+    return _plans[key]
+
+
+def CheckModel(model, plan):
+    """
+    Function checks the objects and variables of compiled extraction definitions against a
+    model and stores their units in the plan, with one varDetails call per object. A variable
+    not in the details of the object (for the objectExtra of its first definition) is looked
+    up with its own objectExtra.
+    """
+
+    details = {}
+
+    def VarDetails(object_name, objectExtra, detail_key):
+        if detail_key not in details:
+            details[detail_key] = {detail.VarName: detail.VarUnits for detail in model[object_name].varDetails(
+                OrcFxAPI.rtTimeHistory, objectExtra)}
+        return details[detail_key]
+
+    object_names = set(obj.Name for obj in model.objects) if hasattr(model, 'objects') else None
+
+    units = []
+    for name, [OrcFxVariableName, object_name, objectExtra_text, objectExtra] in zip(plan['names'], plan['channels']):
+        if object_names is not None and object_name not in object_names:
+            raise Exception('Unknown object {} ({})'.format(object_name, name))
+        var_details = VarDetails(object_name, objectExtra, object_name)
+        if OrcFxVariableName not in var_details:
+            var_details = VarDetails(object_name, objectExtra, (object_name, objectExtra_text))
+        if OrcFxVariableName not in var_details:
+            raise Exception('Unknown variable {} of {} ({})'.format(OrcFxVariableName, object_name, name))
+        units.append(var_details[OrcFxVariableName])
+
+    plan['units'] = units
+
+
+def ExtractChannels(model, extraction_data, period):
+    """
+    Function extracts the time histories of all extraction definitions from a model with one
+    GetMultipleTimeHistories call (one TimeHistory call per variable with older OrcFxAPI versions).
+    The definitions are compiled once per process and checked against the first model.
+
+    Parameters
+    ----------
+    model : OrcFxAPI.Model
+    extraction_data : dict
+        GenVariableName: [OrcFxVariableName, object_name, objectExtra]
+    period : OrcFxAPI.Period
+
+    Returns
+    -------
+    names : list
+        GenVariableNames, in the order of extraction_data
+    values : np.ndarray
+        array of shape (variables, samples), of the float type returned by OrcFxAPI
+    units : list
+        units of the variables
+    """
+
+    plan = CompileExtractionDefs(extraction_data)
+    if plan['units'] is None:
+        CheckModel(model, plan)
+
+    # Definitions grouped by object, so the objects are only looked up once
+    objects = {}
+    specification = []
+    for OrcFxVariableName, object_name, objectExtra_text, objectExtra in plan['channels']:
+        if object_name not in objects:
+            objects[object_name] = model[object_name]
+        specification.append([objects[object_name], OrcFxVariableName, objectExtra])
+
+    if hasattr(OrcFxAPI, 'GetMultipleTimeHistories'):
+        specification = [OrcFxAPI.TimeHistorySpecification(*spec) for spec in specification]
+        values = np.asarray(OrcFxAPI.GetMultipleTimeHistories(specification, period)).T
+    else:
+        values = np.array([obj.TimeHistory(OrcFxVariableName, period, objectExtra)
+                           for obj, OrcFxVariableName, objectExtra in specification])
+
+    return list(plan['names']), values, list(plan['units'])
+
+
+def ChannelStats(values):
+    """
+    Function returns the statistics STAT_NAMES of time histories (variables x samples) as an
+    array of shape (variables, len(STAT_NAMES)), std. dev is the sample standard deviation
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    maximum = values.max(axis=1)
+    minimum = values.min(axis=1)
+
+    return np.column_stack([values.mean(axis=1), maximum, minimum,
+                            np.maximum(np.abs(maximum), np.abs(minimum)), values.std(axis=1, ddof=1)])
+
+
+def ExtractModel(model, extraction_data, time_defs):
+    """
+    Function extracts time histories and statistics for all extraction definitions
+    from a model that has been run (or loaded from a .sim file)
+
+    Parameters
+    ----------
+    model : OrcFxAPI.Model
+    extraction_data : dict
+        GenVariableName: [OrcFxVariableName, object_name, objectExtra]
+    time_defs : list
+        [t_start_res, t_end_res]
+
+    Returns
+    -------
+    dict
+        names, units, time, TH (variables x samples) and stats (variables x STAT_NAMES)
+    """
+
+    period = OrcFxAPI.SpecifiedPeriod(time_defs[0], time_defs[1])
+
+    names, values, units = ExtractChannels(model, extraction_data, period)
+
+    return {
+        'names': np.array(names),
+        'units': np.array(units),
+        'time': np.asarray(model.SampleTimes(period), dtype=np.float64),
+        'TH': values.astype(np.float32),
+        'stats': ChannelStats(values),
+        'stat_names': np.array(STAT_NAMES),
+    }
+
+
+def SaveResults(file_path, results):
+    """
+    Function saves extracted results to a compressed .npz file
+    """
+
+    np.savez_compressed(file_path, **results)
+
+
+def LoadResults(file_path):
+    """
+    Function returns extracted results saved with SaveResults as a dict of arrays
+    """
+
+    with np.load(file_path) as data:
+        return {key: data[key] for key in data.files}
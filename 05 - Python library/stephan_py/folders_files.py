@@ -3,16 +3,19 @@ This module contains functions operating with sim_files
 """
 import os
 import glob
+import json
+import pprint
 import pandas as pd
 
+from . import extraction
+
 def list_simfiles(folder):
     
     """
-    Function returns a list of sim_files for a given folder
+    Function returns a list of sim_files for a given folder, the folders they are in
+    (sorted together with the files) and the prefix of the folder name
     """
 
-    os.chdir(folder)
-    
     prefix = os.path.basename(os.path.normpath(folder)).split("-")[0].strip()
         
     # Make list of *.sim files
@@ -27,7 +30,10 @@ def list_simfiles(folder):
                 sim_files_list.append(file)
                 sim_file_folders_list.append(path)
 
-    sim_files_list = sorted(sim_files_list)
+    # Sort files and their folders together, so that sim_files_list[i] is in sim_file_folders_list[i]
+    pairs = sorted(zip(sim_files_list, sim_file_folders_list))
+    sim_files_list = [file for file, path in pairs]
+    sim_file_folders_list = [path for file, path in pairs]
     
     return [sim_files_list, sim_file_folders_list, prefix]
     
@@ -67,7 +73,7 @@ def checkTHvarsSimilar(selected_folders):
 
     for j in range(len(selected_folders)):
     
-        GenVariableNames_list, units = read_vars_TH(selected_folders[j] + '\\' + sim_files[j][0])
+        GenVariableNames_list, units = read_vars_TH(os.path.join(selected_folders[j], sim_files[j][0]))
     
         GenVariableNames.append(GenVariableNames_list)
         
@@ -107,6 +113,9 @@ def StartDict(object_names, OrcFxVariableNames, GenVariableNames, objectExtras):
         extraction_def[i][1] = object_names[i]
         extraction_def[i][2] = objectExtras[i]
     extraction_dict = dict(zip(GenVariableNames, extraction_def))
+
+    # check the definitions (object extras) before writing them
+    extraction.CompileExtractionDefs(extraction_dict)
     
     with open('extraction_defs_new.json', 'w') as fp:
         json.dump(extraction_dict, fp, ensure_ascii=False, indent=4)
@@ -0,0 +1,306 @@
+"""
+This module contains a small TCP job server and worker client used to spread a
+simulation batch over several machines
+
+Messages are single lines of JSON. A client asks for a job ('get'), sends a heartbeat
+for every running job ('heartbeat') and returns the outcome ('result'). Jobs without a
+heartbeat for heartbeat_timeout seconds are re-queued. There is no authentication, the
+server is meant for a trusted local network.
+"""
+import os
+import time
+import json
+import socket
+import threading
+import socketserver
+import multiprocessing.connection
+
+from . import process_pool
+
+
+def _Send(f, message):
+
+    f.write((json.dumps(message) + '\n').encode('utf-8'))
+    f.flush()
+
+
+def _Receive(f):
+
+    line = f.readline()
+    if not line:
+        raise EOFError('Connection closed')
+
+    return json.loads(line.decode('utf-8'))
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+
+    # The port can be used again at once after a restart of the server, and the connection
+    # threads do not keep the process alive
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class JobServer(object):
+    """
+    Hands out job specs to worker clients and collects their results.
+
+    Failures, timeouts and lost workers are retried like in process_pool.WorkerPool and
+    reported with the same callbacks.
+    """
+
+    def __init__(self, host='0.0.0.0', port=0, retries=0, backoff=10.0, heartbeat_timeout=60.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.heartbeat_timeout = heartbeat_timeout
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.on_done = None
+        self.on_failed = None
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                while True:
+                    try:
+                        request = _Receive(self.rfile)
+                    except (EOFError, OSError, ValueError):
+                        break
+                    _Send(self.wfile, server._Handle(request))
+
+        self.tcp_server = _TCPServer((host, port), Handler)
+        self.address = self.tcp_server.server_address
+
+    def _Handle(self, request):
+
+        op = request.get('op')
+        now = time.time()
+
+        with self.lock:
+            if op == 'get':
+                if self._Finished():
+                    return {'job': None, 'finished': True}
+
+                for key, job in self.jobs.items():
+                    if job['state'] == 'queued' and job['not_before'] <= now:
+                        job.update(state='running', worker=request.get('worker'), started=now, heartbeat=now)
+                        return {'job': {'key': key, 'spec': job['spec'], 'attempt': job['attempt']}}
+
+                return {'job': None, 'finished': False}
+
+            elif op == 'heartbeat':
+                # Tell the worker to stop jobs that were re-queued or finished in the meantime
+                cancel = []
+                for key in request.get('keys', []):
+                    job = self.jobs.get(key)
+                    if job is None or job['state'] != 'running' or job['worker'] != request.get('worker'):
+                        cancel.append(key)
+                    else:
+                        job['heartbeat'] = now
+                return {'cancel': cancel}
+
+            elif op == 'result':
+                job = self.jobs.get(request['key'])
+                if job is None or job['state'] in ('done', 'failed'):
+                    return {'ok': False}
+                if job['state'] != 'running' or job['worker'] != request.get('worker'):
+                    # Result of a job that was re-queued meanwhile, only a success is still useful
+                    if request['status'] != 'done':
+                        return {'ok': False}
+
+                if request['status'] == 'done':
+                    job['state'] = 'done'
+                    self.on_done(request['key'], request['result'])
+                else:
+                    self._Fail(request['key'], request['result'])
+                return {'ok': True}
+
+        return {'error': 'Unknown request: {}'.format(op)}
+
+    def _Fail(self, key, details):
+
+        # Called with the lock held
+        job = self.jobs[key]
+        details['attempt'] = job['attempt']
+        final = job['attempt'] > self.retries
+        self.on_failed(key, details, final)
+        if final:
+            job['state'] = 'failed'
+        else:
+            job.update(state='queued', attempt=job['attempt'] + 1,
+                       not_before=time.time() + self.backoff * 2**(job['attempt'] - 1))
+
+    def _Finished(self):
+
+        return all(job['state'] in ('done', 'failed') for job in self.jobs.values())
+
+    def _Monitor(self):
+
+        # Re-queue jobs of lost workers and stop jobs running longer than their timeout
+        now = time.time()
+        with self.lock:
+            for key, job in self.jobs.items():
+                if job['state'] != 'running':
+                    continue
+                if now - job['heartbeat'] > self.heartbeat_timeout:
+                    self._Fail(key, {'error': 'Lost worker {} (no heartbeat)'.format(job['worker']),
+                                     'traceback': '', 'log': ''})
+                elif job['timeout'] is not None and now - job['started'] > job['timeout']:
+                    self._Fail(key, {'error': 'Timeout after {:.0f} s on worker {}'.format(job['timeout'], job['worker']),
+                                     'traceback': '', 'log': ''})
+
+    def run(self, jobs, on_done, on_failed):
+        """
+        Serve jobs until every job has finished or failed for good
+
+        Parameters
+        ----------
+        jobs : list
+            [key, spec, timeout] in the order they are handed out, spec must be JSON serialisable
+        on_done, on_failed : function
+            Same as for process_pool.WorkerPool.run
+        """
+
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.jobs = {}
+        for key, spec, timeout in jobs:
+            self.jobs[key] = {'spec': spec, 'timeout': timeout, 'state': 'queued', 'attempt': 1,
+                              'not_before': 0.0, 'worker': None}
+
+        thread = threading.Thread(target=self.tcp_server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            while True:
+                self._Monitor()
+                with self.lock:
+                    if self._Finished():
+                        break
+                time.sleep(1.0)
+
+            # Give polling clients the chance to see that the batch is finished
+            time.sleep(2.0)
+        finally:
+            self.tcp_server.shutdown()
+            self.tcp_server.server_close()
+
+
+class JobClient(object):
+    """
+    Worker client pulling job specs from a JobServer and running them in local worker processes.
+
+    func(spec) is run for every job and must be importable by the worker processes; its
+    return value (JSON serialisable) is sent back to the server.
+    """
+
+    def __init__(self, address, func, n_workers=1, heartbeat_interval=10.0, poll_interval=5.0):
+        self.address = address
+        self.func = func
+        self.n_workers = n_workers
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.name = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.lock = threading.Lock()
+        self.running = {}
+        self.finished = threading.Event()
+
+        self.sock = socket.create_connection(address)
+        self.f = self.sock.makefile('rwb')
+
+    def _Request(self, message):
+
+        message['worker'] = self.name
+        with self.lock:
+            _Send(self.f, message)
+            return _Receive(self.f)
+
+    def _Heartbeat(self):
+
+        while not self.finished.wait(self.heartbeat_interval):
+            with self.lock:
+                keys = list(self.running.keys())
+            if not keys:
+                continue
+            try:
+                cancel = self._Request({'op': 'heartbeat', 'keys': keys})['cancel']
+            except (EOFError, OSError):
+                break
+            for key in cancel:
+                with self.lock:
+                    if key in self.running:
+                        self.running[key]['cancel'] = True
+
+    def _Slot(self):
+
+        worker = process_pool._Worker()
+        try:
+            while not self.finished.is_set():
+                try:
+                    reply = self._Request({'op': 'get'})
+                except (EOFError, OSError):
+                    # Server gone, the batch is finished or the server was stopped
+                    self.finished.set()
+                    break
+                if reply['job'] is None:
+                    if reply.get('finished'):
+                        self.finished.set()
+                    else:
+                        time.sleep(self.poll_interval)
+                    continue
+
+                key = reply['job']['key']
+                state = {'cancel': False}
+                with self.lock:
+                    self.running[key] = state
+
+                worker.submit({'func': self.func, 'args': (reply['job']['spec'],)})
+                status, result = None, None
+                while status is None:
+                    ready = multiprocessing.connection.wait([worker.conn, worker.process.sentinel], 1.0)
+                    if worker.conn in ready:
+                        try:
+                            status, result = worker.conn.recv()
+                        except (EOFError, OSError):
+                            ready = [worker.process.sentinel]
+                    if status is None and worker.process.sentinel in ready:
+                        worker.process.join(1.0)
+                        status, result = 'failed', {'error': 'Worker process exited (exit code {})'.format(
+                            worker.process.exitcode), 'traceback': '', 'log': ''}
+                        worker.kill()
+                        worker = process_pool._Worker()
+                    elif status is None and state['cancel']:
+                        # Re-queued or timed out on the server, the result is not wanted any more
+                        worker.kill()
+                        worker = process_pool._Worker()
+                        status = 'cancelled'
+                worker.task = None
+
+                with self.lock:
+                    del self.running[key]
+
+                if status != 'cancelled':
+                    try:
+                        self._Request({'op': 'result', 'key': key, 'status': status, 'result': result})
+                    except (EOFError, OSError):
+                        self.finished.set()
+        finally:
+            worker.stop()
+
+    def run(self):
+        """
+        Run jobs until the server reports that the batch is finished
+        """
+
+        heartbeat = threading.Thread(target=self._Heartbeat, daemon=True)
+        heartbeat.start()
+
+        slots = [threading.Thread(target=self._Slot) for i in range(self.n_workers)]
+        for slot in slots:
+            slot.start()
+        for slot in slots:
+            slot.join()
+
+        self.finished.set()
+        self.sock.close()
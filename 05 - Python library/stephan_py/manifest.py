@@ -0,0 +1,184 @@
+"""
+This module contains the job manifest used to resume simulation batches
+"""
+import os
+import glob
+import json
+import hashlib
+import datetime
+
+# Name of the manifest file written in the main folder of a batch
+MANIFEST_NAME = 'RunOrcFxMult_manifest.json'
+
+# Failing cases with their traceback and captured log, written next to the manifest
+QUARANTINE_NAME = 'RunOrcFxMult_quarantine.json'
+
+# Files next to a .dat file that change the simulation result without changing the .dat file itself
+DEPENDENCY_PATTERNS = ['DISCON*.IN*', '*.dll', '*.so', 'BladedControllerWrapper*.py', 'Cp_Ct_Cq*.txt', '*.GDF']
+
+
+def HashFile(file_path, hash_obj=None):
+    """
+    Function returns (or updates) a sha1 hash of the content of a file
+    """
+
+    if hash_obj is None:
+        hash_obj = hashlib.sha1()
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hash_obj.update(chunk)
+
+    return hash_obj
+
+
+def HashDependencies(folder):
+    """
+    Function returns a hash of the controller and hydrodynamic input files in a folder
+    """
+
+    hash_obj = hashlib.sha1()
+
+    dependency_files = set()
+    for pattern in DEPENDENCY_PATTERNS:
+        dependency_files.update(glob.glob(os.path.join(folder, pattern)))
+
+    for file_path in sorted(dependency_files):
+        hash_obj.update(os.path.basename(file_path).encode('utf-8'))
+        HashFile(file_path, hash_obj)
+
+    return hash_obj.hexdigest()
+
+
+def HashJob(dat_path, dependency_hash):
+    """
+    Function returns the input hash of a single load case
+    """
+
+    hash_obj = HashFile(dat_path)
+    hash_obj.update(dependency_hash.encode('utf-8'))
+
+    return hash_obj.hexdigest()
+
+
+def HashCase(base_path, overrides, dependency_hash):
+    """
+    Function returns the input hash of a batch script load case run from its base model
+    """
+
+    hash_obj = HashFile(base_path)
+    hash_obj.update(json.dumps(overrides).encode('utf-8'))
+    hash_obj.update(dependency_hash.encode('utf-8'))
+
+    return hash_obj.hexdigest()
+
+
+def _now():
+
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+class Manifest(object):
+    """
+    Persistent record of the load cases in a batch folder.
+
+    Each job is stored under its path relative to the batch folder with the input hash,
+    status ('pending', 'done', 'failed' or 'quarantined'), wall time and output .sim and/or
+    result file. A job left 'pending' by an interrupted batch is run again on the next invocation,
+    a quarantined job only when its inputs change or it is explicitly retried.
+    """
+
+    def __init__(self, main_folder, file_name=MANIFEST_NAME):
+        self.main_folder = os.path.abspath(main_folder)
+        self.file_path = os.path.join(self.main_folder, file_name)
+        self.jobs = {}
+
+        if os.path.isfile(self.file_path):
+            with open(self.file_path) as json_file:
+                self.jobs = json.load(json_file).get('jobs', {})
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a half written manifest
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump({'jobs': self.jobs}, fp, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.file_path)
+
+    def key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.main_folder)
+
+    def needsRun(self, key, input_hash, outputs=('sim',)):
+        """
+        A job is run if it is unknown, not finished, has changed inputs or one of the
+        requested outputs ('sim' and/or 'result') is gone
+        """
+
+        job = self.jobs.get(key)
+        if job is None or job.get('status') != 'done' or job.get('hash') != input_hash:
+            return True
+
+        for output in outputs:
+            output_file = job.get(output)
+            if output_file is None or not os.path.isfile(os.path.join(self.main_folder, output_file)):
+                return True
+
+        return False
+
+    def update(self, key, save=True, **fields):
+        job = self.jobs.setdefault(key, {})
+        job.update(fields)
+        if save:
+            self.save()
+
+    def setPending(self, key, input_hash, params=None, save=True):
+        self.update(key, save=save, hash=input_hash, status='pending', queued=_now(), params=params)
+
+    def setDone(self, key, sim_path, wall_time, result_path=None):
+        self._updateQuarantine(key, None)
+        self.update(key, status='done', wall_time=wall_time, finished=_now(), error=None,
+                    sim=None if sim_path is None else self.key(sim_path),
+                    result=None if result_path is None else self.key(result_path))
+
+    def setFailed(self, key, error, wall_time=None):
+        self.update(key, status='failed', wall_time=wall_time, finished=_now(), error=error)
+
+    def isQuarantined(self, key, input_hash):
+        job = self.jobs.get(key)
+        return job is not None and job.get('status') == 'quarantined' and job.get('hash') == input_hash
+
+    def setQuarantined(self, key, details):
+        """
+        Marks a job that failed all its attempts and writes the quarantine list
+        (details: 'error', 'traceback', 'log' and 'attempt')
+        """
+
+        self.update(key, save=False, status='quarantined', finished=_now(), error=details['error'])
+        self._updateQuarantine(key, dict(details, time=_now()))
+        self.save()
+
+    def _updateQuarantine(self, key, details):
+
+        # Add (or with details None remove) a job in the quarantine list
+        quarantine_path = os.path.join(self.main_folder, QUARANTINE_NAME)
+        quarantine = {}
+        if os.path.isfile(quarantine_path):
+            with open(quarantine_path) as json_file:
+                quarantine = json.load(json_file)
+
+        if details is None:
+            if key not in quarantine:
+                return
+            del quarantine[key]
+        else:
+            quarantine[key] = details
+
+        with open(quarantine_path, 'w') as fp:
+            json.dump(quarantine, fp, indent=4, sort_keys=True)
+
+    def runtimeRecords(self):
+        """
+        Returns [params, wall_time] of all finished jobs with recorded case parameters
+        """
+
+        return [[job['params'], job['wall_time']] for job in self.jobs.values()
+                if job.get('status') == 'done' and job.get('params') and job.get('wall_time')]
@@ -0,0 +1,222 @@
+"""
+This module contains a process pool for simulation jobs with per-job timeouts,
+bounded retries and failure reporting, and a thread pool with the same interface
+for extraction and other lightweight jobs
+"""
+import io
+import sys
+import time
+import traceback
+import threading
+import concurrent.futures
+import multiprocessing
+import multiprocessing.connection
+
+# Characters of captured job output kept for failed jobs
+LOG_TAIL = 20000
+
+
+def _WorkerLoop(conn):
+
+    # Run jobs received on conn until None is received. Output printed by a job (e.g. by the
+    # controller wrapper) is captured and sent back with the traceback if the job fails.
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+
+        func, args = task
+        log = io.StringIO()
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = log
+        try:
+            result = ['done', func(*args)]
+        except BaseException as error:
+            result = ['failed', {'error': repr(error), 'traceback': traceback.format_exc(),
+                                 'log': log.getvalue()[-LOG_TAIL:]}]
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+        conn.send(result)
+
+
+class _Worker(object):
+
+    def __init__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_WorkerLoop, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = None
+
+    def submit(self, task):
+        self.task = task
+        self.started = time.time()
+        self.conn.send([task['func'], task['args']])
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, EOFError):
+            pass
+        self.process.join(5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class WorkerPool(object):
+    """
+    Pool of worker processes running jobs with a wall-clock timeout per job.
+
+    A job that raises, times out or kills its worker process is retried up to 'retries'
+    times, waiting backoff * 2**(attempt - 1) seconds before each retry. Hung or crashed
+    workers are terminated and replaced, so the other workers keep running at full throughput.
+    """
+
+    def __init__(self, n_workers, retries=0, backoff=10.0):
+        self.n_workers = n_workers
+        self.retries = retries
+        self.backoff = backoff
+
+    def run(self, jobs, on_done, on_failed):
+        """
+        Run all jobs and return when every job has finished or failed for good
+
+        Parameters
+        ----------
+        jobs : list
+            [key, func, args, timeout] in the order they are submitted, timeout in seconds or None.
+            func must be importable by the worker processes (module level function).
+        on_done : function
+            on_done(key, result), called in this process for every finished job
+        on_failed : function
+            on_failed(key, details, final), called for every failed attempt. details holds
+            'error', 'traceback', 'log' and 'attempt'; final is True when no retry is left.
+        """
+
+        queue = [{'key': key, 'func': func, 'args': args, 'timeout': timeout, 'attempt': 1, 'not_before': 0.0}
+                 for key, func, args, timeout in jobs]
+
+        workers = [_Worker() for i in range(min(self.n_workers, len(queue)))]
+
+        try:
+            while queue or any(worker.task is not None for worker in workers):
+
+                # Hand out jobs to idle workers, jobs waiting for a retry are skipped until due
+                now = time.time()
+                for worker in workers:
+                    if worker.task is None:
+                        ready = [task for task in queue if task['not_before'] <= now]
+                        if ready:
+                            queue.remove(ready[0])
+                            worker.submit(ready[0])
+
+                busy = [worker for worker in workers if worker.task is not None]
+                if not busy:
+                    time.sleep(max(0.0, min(task['not_before'] for task in queue) - now))
+                    continue
+
+                # Wait for a result, a crashed worker or the next timeout / retry
+                wait_time = 1.0
+                for worker in busy:
+                    if worker.task['timeout'] is not None:
+                        wait_time = min(wait_time, worker.started + worker.task['timeout'] - now)
+                ready = multiprocessing.connection.wait(
+                    [worker.conn for worker in busy] + [worker.process.sentinel for worker in busy],
+                    max(wait_time, 0.0))
+
+                for i, worker in enumerate(workers):
+                    if worker.task is None:
+                        continue
+
+                    task = worker.task
+                    failure = None
+
+                    if worker.conn in ready:
+                        try:
+                            status, result = worker.conn.recv()
+                        except (EOFError, OSError):
+                            worker.process.join(1.0)
+                            status, result = 'failed', {'error': 'Worker process exited (exit code {})'.format(
+                                worker.process.exitcode), 'traceback': '', 'log': ''}
+                            workers[i] = self._Replace(worker)
+                        worker.task = None
+                        if status == 'done':
+                            on_done(task['key'], result)
+                        else:
+                            failure = result
+                    elif worker.process.sentinel in ready:
+                        failure = {'error': 'Worker process exited (exit code {})'.format(worker.process.exitcode),
+                                   'traceback': '', 'log': ''}
+                        workers[i] = self._Replace(worker)
+                    elif task['timeout'] is not None and time.time() - worker.started > task['timeout']:
+                        failure = {'error': 'Timeout after {:.0f} s'.format(task['timeout']), 'traceback': '', 'log': ''}
+                        workers[i] = self._Replace(worker)
+
+                    if failure is not None:
+                        failure['attempt'] = task['attempt']
+                        final = task['attempt'] > self.retries
+                        on_failed(task['key'], failure, final)
+                        if not final:
+                            task['not_before'] = time.time() + self.backoff * 2**(task['attempt'] - 1)
+                            task['attempt'] += 1
+                            queue.append(task)
+        finally:
+            for worker in workers:
+                worker.stop()
+
+    def _Replace(self, worker):
+
+        # Terminate a hung or crashed worker and start a fresh one in its place
+        worker.kill()
+        return _Worker()
+
+
+class ThreadPool(object):
+    """
+    Thread pool with the same interface as WorkerPool, for jobs that do not need their own
+    process (e.g. extraction from .sim files). Jobs must not change the working directory.
+    A thread can not be stopped, so timeouts are not enforced and job output is not captured.
+    """
+
+    def __init__(self, n_workers, retries=0, backoff=10.0):
+        self.n_workers = n_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.lock = threading.Lock()
+
+    def _Run(self, key, func, args, on_done, on_failed):
+
+        for attempt in range(1, self.retries + 2):
+            try:
+                result = func(*args)
+            except Exception as error:
+                details = {'error': repr(error), 'traceback': traceback.format_exc(), 'log': '', 'attempt': attempt}
+                final = attempt > self.retries
+                with self.lock:
+                    on_failed(key, details, final)
+                if final:
+                    return
+                time.sleep(self.backoff * 2**(attempt - 1))
+            else:
+                with self.lock:
+                    on_done(key, result)
+                return
+
+    def run(self, jobs, on_done, on_failed):
+        """
+        Run all jobs, see WorkerPool.run. The timeout of the jobs is ignored and the callbacks
+        are called one at a time from the worker threads.
+        """
+
+        with concurrent.futures.ThreadPoolExecutor(self.n_workers) as executor:
+            futures = [executor.submit(self._Run, key, func, args, on_done, on_failed)
+                       for key, func, args, timeout in jobs]
+            for future in futures:
+                future.result()
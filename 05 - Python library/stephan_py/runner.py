@@ -0,0 +1,423 @@
+"""
+This module contains the batch runner, run as 'python -m stephan_py <batch folder>'
+
+Runs all load cases (*.dat files or batch script cases) of a batch folder in a pool of
+worker processes, on job server clients or in threads, see main() or --help.
+"""
+import os
+import time
+import base64
+import socket
+import threading
+import argparse
+import functools
+import OrcFxAPI
+
+from . import manifest as mf
+from . import extraction as ex
+from . import batch_script as bs
+from . import schedule as sc
+from . import telemetry as tm
+from . import process_pool as pp
+from . import job_server as js
+from . import selection
+
+# Base models loaded once per worker process: (thread id, base file path) -> [modification time, model]
+templates = {}
+
+def save_outputs(model, folder, case_name, extraction, keep_sim, timer):
+
+    # extraction: None or [extraction_data, time_defs]. When given, the configured time histories
+    # and statistics are saved to <case>_res.npz while the model is still in memory, and the
+    # .sim file is only saved if keep_sim is True.
+
+    sim_path = None
+    result_path = None
+
+    if extraction is not None:
+        extraction_data, time_defs = extraction
+        result_path = os.path.join(folder, case_name + "_res.npz")
+        ex.SaveResults(result_path, ex.ExtractModel(model, extraction_data, time_defs))
+    timer.lap('extract_time')
+
+    if extraction is None or keep_sim:
+        sim_path = os.path.join(folder, case_name + ".sim")
+        model.SaveSimulation(sim_path)
+    timer.lap('save_time')
+
+    timer.event['sim'] = sim_path
+    timer.event['result'] = result_path
+
+
+def worker(file_name, folder, extraction=None, keep_sim=True):
+
+    # Returns the telemetry event of the job, including the output file paths.
+    # Only absolute paths are used (no os.chdir), so jobs can also run in threads.
+
+    timer = tm.JobTimer()
+
+    model = OrcFxAPI.Model()
+
+    model.LoadData(os.path.join(folder, file_name))
+    timer.lap('load_time')
+
+    model.RunSimulation()
+    timer.lap('solve_time')
+
+    case_name = os.path.splitext(file_name)[0]
+
+    save_outputs(model, folder, case_name, extraction, keep_sim, timer)
+    timer.finish(model)
+
+    # Resetting finalises the external functions, which write the controller profile
+    model.Reset()
+    timer.event['controller'] = tm.ReadControllerProfile(os.path.join(folder, file_name), timer.event['start'])
+
+    return timer.event
+
+
+def template_model(base_path):
+
+    # Return the base model of this process (and thread), loading it only the first time or when the file changed
+    key = (threading.get_ident(), base_path)
+    mtime = os.path.getmtime(base_path)
+    if key not in templates or templates[key][0] != mtime:
+        model = OrcFxAPI.Model()
+        model.LoadData(base_path)
+        templates[key] = [mtime, model]
+
+    return templates[key][1]
+
+
+def set_controller_output(model, output_name):
+
+    # Name the debug and profile files of the controller wrapper (ControllerOutputName tag of the
+    # turbines with a ControllerDLL tag). Without it they are named after the model file, which
+    # all the cases of a batch script share. None removes the tag.
+    for model_object in model.objects:
+        tags = model_object.tags
+        if 'ControllerDLL' not in tags:
+            continue
+        if output_name is not None:
+            tags['ControllerOutputName'] = output_name
+        elif 'ControllerOutputName' in tags:
+            del tags['ControllerOutputName']
+
+
+def warm_worker(file_name, folder, case, extraction=None, keep_sim=True):
+
+    # Run a batch script load case by applying its data changes to the base model
+    # already loaded in this process instead of loading the case .dat file
+
+    timer = tm.JobTimer()
+    timer.event['warm'] = True
+
+    base_path = os.path.join(folder, case['LoadData'])
+    model = template_model(base_path)
+
+    case_name = os.path.splitext(file_name)[0]
+
+    try:
+        undo = bs.ApplyOverrides(model, case['Overrides'])
+        set_controller_output(model, os.path.join(folder, case_name))
+        timer.lap('load_time')
+
+        model.RunSimulation()
+        timer.lap('solve_time')
+
+        save_outputs(model, folder, case_name, extraction, keep_sim, timer)
+        timer.finish(model)
+
+        model.Reset()
+        bs.RestoreOverrides(model, undo)
+        set_controller_output(model, None)
+
+        timer.event['controller'] = tm.ReadControllerProfile(os.path.join(folder, file_name), timer.event['start'])
+    except BaseException:
+        # The template state is unknown (also after a data change that failed part-way), load it again for the next case
+        del templates[(threading.get_ident(), base_path)]
+        raise
+
+    return timer.event
+
+
+def run_spec(spec, folder_map=(), push_results=False):
+
+    # Run a job spec ('file_name', 'folder', 'case', 'extraction', 'keep_sim'). Used by the
+    # local pool and by job server clients, which may see the batch folder under another path
+    # (folder_map: [server path, local path]) and may send the result file back to the server.
+
+    folder = spec['folder']
+    for server_path, local_path in folder_map:
+        if folder.startswith(server_path):
+            folder = local_path + folder[len(server_path):]
+            break
+    if os.sep != '\\':
+        folder = folder.replace('\\', os.sep)
+
+    if spec['case'] is None:
+        event = worker(spec['file_name'], folder, spec['extraction'], spec['keep_sim'])
+    else:
+        event = warm_worker(spec['file_name'], folder, spec['case'], spec['extraction'], spec['keep_sim'])
+
+    if push_results and event['result'] is not None:
+        with open(event['result'], 'rb') as f:
+            event['result_data'] = base64.b64encode(f.read()).decode('ascii')
+
+    return event
+
+
+def folders_files(main_folder):
+
+
+    #Create list of *.dat files without base in the filename
+    jobs = []
+
+    for path, subdirs, files in os.walk(main_folder):
+        for file in files:
+            if file.find('.dat') > 0:
+                if file.find('Base') == -1:
+                    jobs.append([file, path])
+                    print(file)
+                    print(path)
+
+    # Sort file and folder together so they stay paired
+    jobs = sorted(jobs)
+
+    dat_files_list = [job[0] for job in jobs]
+    folders_list = [job[1] for job in jobs]
+
+    return [dat_files_list, folders_list]
+
+
+def job_done(manifest, run, key, event):
+
+    # run: id of this run of the batch runner (telemetry.NewRunId), the report is grouped by it
+    manifest.setDone(key, event['sim'], event['wall_time'], event['result'])
+
+    event['job'] = key
+    event['batch'] = manifest.main_folder
+    event['run'] = run
+    tm.WriteEvent(os.path.join(manifest.main_folder, tm.TELEMETRY_NAME), event)
+
+    print('Done: ', key, ' {:.0f} s'.format(event['wall_time']))
+
+
+def remote_job_done(manifest, specs, run, key, event):
+
+    # Output paths reported by a job server client are replaced by the paths in this batch
+    # folder, and a result file sent back by the client is written there
+    folder = specs[key]['folder']
+    for output in ['sim', 'result']:
+        if event[output] is not None:
+            event[output] = os.path.join(folder, event[output].replace('\\', '/').split('/')[-1])
+
+    if 'result_data' in event:
+        with open(event['result'], 'wb') as f:
+            f.write(base64.b64decode(event.pop('result_data')))
+
+    job_done(manifest, run, key, event)
+
+
+def job_failed(manifest, run, key, details, final):
+
+    # details: 'error', 'traceback', 'log' and 'attempt'; final: no retry left
+    status = 'quarantined' if final else 'retry'
+
+    event = {'job': key, 'batch': manifest.main_folder, 'run': run, 'host': socket.gethostname(), 'end': time.time(),
+             'status': status, 'error': details['error'], 'attempt': details['attempt']}
+    tm.WriteEvent(os.path.join(manifest.main_folder, tm.TELEMETRY_NAME), event)
+
+    if final:
+        manifest.setQuarantined(key, details)
+    else:
+        manifest.setFailed(key, details['error'])
+
+    print('Failed ({}): '.format(status), key, ' ', details['error'])
+
+
+def main(argv=None):
+    """
+    Run the batch runner with command line arguments argv (default sys.argv[1:])
+    """
+
+
+    parser = argparse.ArgumentParser(prog='python -m stephan_py', description='Run all load cases (*.dat files or batch script cases) in a batch folder')
+    parser.add_argument('main_folder', nargs='?', default=os.getcwd())
+    parser.add_argument('--force', action='store_true', help='run all cases, also those finished with unchanged inputs')
+    parser.add_argument('--extract', metavar='DEFS_JSON', help='extract the variables in DEFS_JSON (e.g. extraction_defs.json) to <case>_res.npz right after each run')
+    parser.add_argument('--period', nargs=2, type=float, default=[0.0, 600.0], metavar=('T_START', 'T_END'), help='extraction period [s]')
+    parser.add_argument('--keep-sim', action='store_true', help='also save the .sim file when extracting')
+    parser.add_argument('--warm', action='store_true', help='run cases found in a batch script (*_rev*_1.txt) from a base model loaded once per worker')
+    parser.add_argument('--script', action='append', default=[], help='run the load cases of a batch script directly from its base model, without .dat files (can be repeated)')
+    parser.add_argument('--workers', default='auto', help="number of worker processes or 'auto' (from cores and available memory)")
+    parser.add_argument('--memory-per-worker', type=float, default=2.0, metavar='GB', help="memory needed per worker for --workers auto [GB]")
+    parser.add_argument('--history', action='append', default=[], metavar='FOLDER', help='also use the run times recorded in the manifest of another batch folder to predict run times (can be repeated)')
+    parser.add_argument('--timeout', help="wall-clock timeout per job in seconds, or 'auto' (three times the predicted run time)")
+    parser.add_argument('--retries', type=int, default=1, help='number of retries of a failed or timed out job before it is quarantined')
+    parser.add_argument('--backoff', type=float, default=30.0, metavar='SECONDS', help='wait before the first retry, doubled for each further retry')
+    parser.add_argument('--retry-quarantined', action='store_true', help='also run quarantined cases with unchanged inputs')
+    parser.add_argument('--threads', action='store_true', help='run the jobs in threads of this process instead of worker processes (no timeouts)')
+    parser.add_argument('--serve', type=int, metavar='PORT', help='serve the jobs to worker clients on other machines instead of running them here')
+    parser.add_argument('--heartbeat-timeout', type=float, default=60.0, metavar='SECONDS', help='re-queue a served job when its client sends no heartbeat for this long')
+    parser.add_argument('--connect', metavar='HOST:PORT', help='run as worker client of a job server, with --workers local worker processes')
+    parser.add_argument('--map', action='append', default=[], metavar='SERVER_PATH=LOCAL_PATH', help='client: path of the batch folders on this machine (can be repeated)')
+    parser.add_argument('--push-results', action='store_true', help='client: send extracted result files back to the server (no shared disk)')
+    parser.add_argument('--select', metavar='SELECTION', help="only run the selected cases, e.g. 'U1[0-4]*', 'U10-14 seed10001', 'case32-49' (see stephan_py.selection)")
+    parser.add_argument('--dry-run', action='store_true', help='only print the plan: cases to run in submission order, predicted run times and timeouts')
+    parser.add_argument('--report', action='store_true', help='only print the throughput report of the batch telemetry (main folder and --history folders), with the controller wrapper profiles of jobs run with the ProfileController tag')
+    args = parser.parse_args(argv)
+    if args.workers != 'auto' and not (args.workers.isdigit() and int(args.workers) >= 1):
+        parser.error("--workers must be a number of at least 1 or 'auto': " + args.workers)
+
+    main_folder = os.path.abspath(args.main_folder)
+
+    if args.connect is not None:
+        host, port = args.connect.rsplit(':', 1)
+        n_threads = sc.AutoWorkers(os.cpu_count() or 1, args.memory_per_worker) if args.workers == 'auto' else int(args.workers)
+        folder_map = [mapping.split('=', 1) for mapping in args.map]
+        print('Worker client of ', args.connect, ' with ', n_threads, ' workers')
+        client = js.JobClient((host, int(port)), functools.partial(run_spec, folder_map=folder_map, push_results=args.push_results), n_threads)
+        client.run()
+        return
+
+    if args.report:
+        events = []
+        for folder in [main_folder] + args.history:
+            telemetry_path = os.path.join(folder, tm.TELEMETRY_NAME)
+            if os.path.isfile(telemetry_path):
+                events += tm.ReadEvents(telemetry_path)
+        print(tm.Report(events))
+        return
+
+    if args.extract is None:
+        extraction = None
+        outputs = ['sim']
+    else:
+        extraction = [ex.LoadExtractionDefs(args.extract), args.period]
+        outputs = ['result', 'sim'] if args.keep_sim else ['result']
+
+    print(main_folder)
+
+    # Load cases as [file_name, folder, case], case is None for cases run from their .dat file
+    candidates = []
+
+    if args.script:
+        # Cases are taken straight from the batch scripts and run from their base model,
+        # no .dat file is written for them
+        for script in args.script:
+            for job in bs.ScriptJobs(os.path.join(main_folder, script)):
+                candidates.append([job['case']['SaveData'], job['folder'], job['case']])
+    else:
+        dat_files_list, folders_list = folders_files(main_folder)
+
+        script_cases = {}
+        for i in range(len(dat_files_list)):
+            folder = folders_list[i]
+            if args.warm and folder not in script_cases:
+                script_cases[folder] = bs.CasesInFolder(folder)
+            candidates.append([dat_files_list[i], folder, script_cases.get(folder, {}).get(dat_files_list[i])])
+
+    if args.select is not None:
+        select = selection.ParseSelection(args.select)
+        n_candidates = len(candidates)
+        candidates = [candidate for candidate in candidates if selection.Selected(select, candidate[0], candidate[2])]
+        print(len(candidates), ' of ', n_candidates, ' cases selected by ', args.select)
+
+    # Only run cases that are missing, failed or have changed inputs since the last run
+    manifest = mf.Manifest(main_folder)
+    dependency_hashes = {}
+
+    # Run times of earlier runs, used below to predict the run times of the queued cases
+    records = manifest.runtimeRecords()
+    for history_folder in args.history:
+        records += mf.Manifest(history_folder).runtimeRecords()
+
+    jobs = []
+    for file_name, folder, case in candidates:
+        if folder not in dependency_hashes:
+            dependency_hashes[folder] = mf.HashDependencies(folder)
+
+        dat_path = os.path.join(folder, file_name)
+        key = manifest.key(dat_path)
+        if case is None:
+            input_hash = mf.HashJob(dat_path, dependency_hashes[folder])
+        else:
+            base_path = os.path.join(folder, case['LoadData'])
+            input_hash = mf.HashCase(base_path, case['Overrides'], dependency_hashes[folder])
+
+        if manifest.isQuarantined(key, input_hash) and not (args.force or args.retry_quarantined):
+            print('Skipped (quarantined): ', key)
+        elif args.force or manifest.needsRun(key, input_hash, outputs):
+            params = sc.CaseParameters(file_name, case)
+            if not args.dry_run:
+                manifest.setPending(key, input_hash, params, save=False)
+            jobs.append([file_name, folder, key, case, params])
+        else:
+            print('Skipped (up to date): ', key)
+    if not args.dry_run:
+        manifest.save()
+
+    print(len(jobs), ' of ', len(candidates), ' cases to run')
+
+    # Submit the longest jobs first so the batch does not end with a tail of a few long runs
+    durations = sc.PredictDurations(records, [job[4] for job in jobs])
+    order = sorted(range(len(jobs)), key=lambda i: -durations[i])
+    jobs = [jobs[i] for i in order]
+
+    if args.workers == 'auto':
+        n_threads = sc.AutoWorkers(len(jobs), args.memory_per_worker)
+    else:
+        n_threads = int(args.workers)
+
+    print('Workers: ', n_threads, ', run times predicted from ', len(records), ' finished runs')
+
+    # Wall-clock timeout per job, 'auto' allows three times the predicted run time
+    if args.timeout is None:
+        timeouts = [None] * len(jobs)
+    elif args.timeout == 'auto':
+        if records:
+            timeouts = [max(3.0 * durations[i], 60.0) for i in order]
+        else:
+            print('No recorded run times, --timeout auto is not applied')
+            timeouts = [None] * len(jobs)
+    else:
+        timeouts = [float(args.timeout)] * len(jobs)
+
+    if args.dry_run:
+        print('Dry run, submission order:')
+        for i, job in enumerate(jobs):
+            print('{:5d} {:8.0f} s {:>10} {:4} {}'.format(i + 1, durations[order[i]],
+                  '-' if timeouts[i] is None else '{:.0f} s'.format(timeouts[i]),
+                  'warm' if job[3] is not None else 'dat', job[2]))
+        if records:
+            print('Predicted makespan: {:.0f} s'.format(sum(durations) / n_threads))
+        else:
+            print('No recorded run times, the predicted run times are only relative')
+        return
+
+    run = tm.NewRunId()
+
+    specs = {}
+    for file_name, folder, key, case, params in jobs:
+        specs[key] = {'file_name': file_name, 'folder': folder, 'case': case,
+                      'extraction': extraction, 'keep_sim': args.keep_sim}
+
+    if args.serve is not None:
+        server = js.JobServer(port=args.serve, retries=args.retries, backoff=args.backoff,
+                              heartbeat_timeout=args.heartbeat_timeout)
+        print('Serving ', len(jobs), ' jobs on port ', server.address[1])
+        server.run([[job[2], specs[job[2]], timeouts[i]] for i, job in enumerate(jobs)],
+                   functools.partial(remote_job_done, manifest, specs, run), functools.partial(job_failed, manifest, run))
+    elif args.threads:
+        pool = pp.ThreadPool(n_threads, args.retries, args.backoff)
+        pool.run([[job[2], run_spec, (specs[job[2]],), timeouts[i]] for i, job in enumerate(jobs)],
+                 functools.partial(job_done, manifest, run), functools.partial(job_failed, manifest, run))
+    else:
+        pool = pp.WorkerPool(n_threads, args.retries, args.backoff)
+        pool.run([[job[2], run_spec, (specs[job[2]],), timeouts[i]] for i, job in enumerate(jobs)],
+                 functools.partial(job_done, manifest, run), functools.partial(job_failed, manifest, run))
+
+    quarantined = [key for key, job in manifest.jobs.items() if job.get('status') == 'quarantined']
+    if quarantined:
+        print(len(quarantined), ' quarantined cases, see ', mf.QUARANTINE_NAME)
@@ -0,0 +1,165 @@
+"""
+This module contains functions ordering simulation jobs by predicted run time and
+sizing the worker pool
+"""
+import os
+import re
+import ctypes
+import numpy as np
+
+# Default simulation length [s] when a load case does not change the stage durations
+DEFAULT_SIM_LENGTH = 600.0
+
+
+def CaseParameters(file_name, case=None):
+    """
+    Function returns the parameters the run time of a load case depends on
+
+    Parameters
+    ----------
+    file_name : str
+        Case file name, e.g. '00001_s1(IPC)_w(..._U04_SEED10001)_W(NTM_U4.0_SEED10001).dat'
+    case : dict or None
+        Batch script load case (see batch_script.ReadBatchScript), used before the file name
+
+    Returns
+    -------
+    dict
+        wind_speed [m/s] (None if unknown), individual (IPC), turbulent, sim_length [s]
+    """
+
+    overrides = {}
+    if case is not None:
+        for object_name, data_name, index, value in case['Overrides']:
+            overrides.setdefault(data_name, []).append(value)
+
+    # Wind speed
+    wind_speed = None
+    if 'WindTimeHistoryDataSpeed' in overrides:
+        wind_speed = float(max(overrides['WindTimeHistoryDataSpeed']))
+    elif 'WindSpeed' in overrides and overrides.get('WindType', [''])[-1] == 'Constant':
+        wind_speed = float(overrides['WindSpeed'][-1])
+    else:
+        match = re.search(r'W\((?:NTM_)?U(\d+(?:\.\d+)?)', file_name) or re.search(r'_U(\d+(?:\.\d+)?)', file_name)
+        if match:
+            wind_speed = float(match.group(1))
+
+    # Pitch control mode
+    if 'PitchControlMode' in overrides:
+        individual = overrides['PitchControlMode'][-1] == 'Individual'
+    else:
+        individual = 'IPC' in file_name
+
+    # Turbulent (full field) or steady wind
+    if 'WindType' in overrides:
+        turbulent = overrides['WindType'][-1] == 'Full field'
+    else:
+        turbulent = 'NTM' in file_name
+
+    # Simulation length from the stage durations
+    sim_length = DEFAULT_SIM_LENGTH
+    if 'StageDuration' in overrides:
+        sim_length = float(sum(overrides['StageDuration']))
+
+    return {'wind_speed': wind_speed, 'individual': individual, 'turbulent': turbulent, 'sim_length': sim_length}
+
+
+def _Features(params):
+
+    U = params['wind_speed'] if params['wind_speed'] is not None else 10.0
+    return [1.0, U, U**2, float(params['individual']), float(params['turbulent'])]
+
+
+def _Prior(params):
+
+    # Relative run time without any recorded runs: faster rotor and more controller
+    # activity at high wind speeds, IPC and turbulent wind cost extra
+    U = params['wind_speed'] if params['wind_speed'] is not None else 10.0
+    factor = (1.0 + U / 10.0) * (1.3 if params['individual'] else 1.0) * (1.5 if params['turbulent'] else 1.0)
+    return factor * params['sim_length'] / DEFAULT_SIM_LENGTH
+
+
+def PredictDurations(records, params_list):
+    """
+    Function returns predicted wall times [s] for load cases
+
+    Parameters
+    ----------
+    records : list
+        [params, wall_time] of finished runs
+    params_list : list
+        params (see CaseParameters) of the cases to predict
+
+    Returns
+    -------
+    np.array
+        Predicted wall time per case. Without records the values are only relative.
+    """
+
+    prior = np.array([_Prior(params) for params in params_list])
+
+    if len(records) == 0:
+        return prior
+
+    # Fit wall time per simulated second on the case parameters
+    X = np.array([_Features(params) for params, wall_time in records])
+    y = np.array([wall_time / params['sim_length'] for params, wall_time in records])
+
+    if len(records) >= 2 * X.shape[1]:
+        coef = np.linalg.lstsq(X, y, rcond=None)[0]
+        X_pred = np.array([_Features(params) for params in params_list])
+        rate = np.clip(X_pred @ coef, 0.5 * y.min(), None)
+        return rate * np.array([params['sim_length'] for params in params_list])
+
+    # Too few runs for a fit: scale the prior to the recorded run times
+    prior_records = np.array([_Prior(params) for params, wall_time in records])
+    scale = np.mean([wall_time for params, wall_time in records]) / prior_records.mean()
+
+    return prior * scale
+
+
+def AvailableMemory():
+    """
+    Function returns the available physical memory in bytes, or None if unknown
+    """
+
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+
+    if os.path.isfile('/proc/meminfo'):
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+
+    if os.name == 'nt':
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+
+    return None
+
+
+def AutoWorkers(n_jobs, memory_per_worker=2.0):
+    """
+    Function returns the number of worker processes from the number of cores and the
+    available memory (memory_per_worker in GB), never more than the number of jobs
+    """
+
+    n_workers = os.cpu_count() or 1
+
+    memory = AvailableMemory()
+    if memory is not None:
+        n_workers = min(n_workers, int(memory / (memory_per_worker * 1024**3)))
+
+    return max(1, min(n_workers, n_jobs))
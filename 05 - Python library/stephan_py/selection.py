@@ -0,0 +1,105 @@
+"""
+This module contains the selection language choosing load cases of a batch by wind
+speed, seed, case index or name
+
+A selection is a list of terms separated by spaces, a case is selected when it matches
+every term. A term is a list of alternatives separated by commas, matched when any of
+them matches:
+
+    U<glob> or U<a>-<b>       wind speed [m/s], e.g. 'U1[0-4]*', 'U4,U6', 'U10-14.5'
+    seed<glob> or seed<a>-<b> seed, e.g. 'seed10001', 'seed1000[1-3]'
+    case<glob> or case<a>-<b> case index (number in front of the file name), e.g. 'case32-49'
+    <glob>                    case file name, e.g. '*IPC*'
+
+A term starting with '!' selects the cases not matching it, e.g. '!*IPC*'.
+Wind speeds are matched as written by '{:g}', i.e. '10' for 10.0 m/s and '4.5' for 4.5 m/s.
+"""
+import re
+import fnmatch
+
+from . import schedule
+
+# Fields of the selection language, prefix -> key of CaseFields
+_FIELDS = [['U', 'wind_speed'], ['seed', 'seed'], ['case', 'index']]
+
+
+def CaseFields(file_name, case=None):
+    """
+    Function returns the fields a load case can be selected by: name (file name without
+    extension), wind_speed, seed and index (None when unknown)
+    """
+
+    name = re.sub(r'\.(dat|sim)$', '', file_name)
+
+    seed = None
+    match = re.search(r'SEED(\d+)', name, re.IGNORECASE)
+    if match:
+        seed = int(match.group(1))
+    elif case is not None:
+        for object_name, data_name, index, value in case['Overrides']:
+            if data_name in ('WaveSeed', 'WindSeed'):
+                seed = int(value)
+
+    index = None
+    match = re.match(r'(\d+)', name)
+    if match:
+        index = int(match.group(1))
+    elif case is not None:
+        index = case['LoadCase']
+
+    return {'name': name, 'wind_speed': schedule.CaseParameters(file_name, case)['wind_speed'],
+            'seed': seed, 'index': index}
+
+
+def _MatchValue(pattern, value):
+
+    # Numeric range 'a-b' (inclusive) or glob on the value formatted with '{:g}'
+    if value is None:
+        return False
+
+    match = re.match(r'^(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)$', pattern)
+    if match:
+        return float(match.group(1)) <= value <= float(match.group(2))
+
+    return fnmatch.fnmatchcase('{:g}'.format(value), pattern)
+
+
+def _MatchAlternative(alternative, fields):
+
+    for prefix, key in _FIELDS:
+        if alternative.startswith(prefix) and len(alternative) > len(prefix) and alternative[len(prefix)] in '0123456789[*?':
+            return _MatchValue(alternative[len(prefix):], fields[key])
+
+    return fnmatch.fnmatchcase(fields['name'], alternative)
+
+
+def ParseSelection(text):
+    """
+    Function returns a selection string as a list of terms [negated, alternatives]
+    """
+
+    terms = []
+    for term in text.split():
+        negated = term.startswith('!')
+        alternatives = [alternative for alternative in term.lstrip('!').split(',') if alternative]
+        if not alternatives:
+            raise Exception('Empty selection term: {}'.format(term))
+        terms.append([negated, alternatives])
+
+    return terms
+
+
+def Selected(selection, file_name, case=None):
+    """
+    Function returns True if a load case matches a selection (string or ParseSelection result)
+    """
+
+    if isinstance(selection, str):
+        selection = ParseSelection(selection)
+
+    fields = CaseFields(file_name, case)
+    for negated, alternatives in selection:
+        if any(_MatchAlternative(alternative, fields) for alternative in alternatives) == negated:
+            return False
+
+    return True
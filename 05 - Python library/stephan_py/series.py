@@ -0,0 +1,205 @@
+"""
+This module contains the parallel extraction of all .sim files of a series folder into one
+series result file
+
+    python -m stephan_py.series <series folder> --extract extraction_defs.json --workers 8
+
+Every worker process loads its own .sim file and sends back the time histories and statistics
+of the extraction definitions (see extraction.ExtractModel), which are merged in file order into
+<prefix>_series.npz in the series folder (prefix as in folders_files.list_simfiles), or into
+the columnar store <prefix>_store with --store (see store).
+"""
+import os
+import argparse
+import numpy as np
+import OrcFxAPI
+
+from . import folders_files as ff
+from . import extraction as ex
+from . import schedule as sc
+from . import process_pool as pp
+from . import store as st
+
+# Series result file in the series folder, <prefix>_series.npz
+SERIES_SUFFIX = '_series.npz'
+
+
+def SeriesPath(folder):
+    """
+    Function returns the path of the series result file of a series folder
+    """
+
+    prefix = ff.list_simfiles(folder)[2]
+    return os.path.join(folder, prefix + SERIES_SUFFIX)
+
+
+def StorePath(folder):
+    """
+    Function returns the path of the result store of a series folder
+    """
+
+    prefix = ff.list_simfiles(folder)[2]
+    return os.path.join(folder, prefix + st.STORE_SUFFIX)
+
+
+def ExtractSimFile(sim_path, extraction_data, time_defs):
+    """
+    Function returns the extraction results (see extraction.ExtractModel) of a .sim file
+    """
+
+    model = OrcFxAPI.Model(sim_path)
+    return ex.ExtractModel(model, extraction_data, time_defs)
+
+
+def MergeResults(files, results):
+    """
+    Function merges the extraction results of several .sim files into one series
+
+    Parameters
+    ----------
+    files : list
+        .sim files (relative to the series folder), in the order of the series
+    results : list
+        extraction.ExtractModel results of the files
+
+    Returns
+    -------
+    dict
+        files, names, units, stat_names, time, TH (files x variables x samples) and
+        stats (files x variables x stat_names)
+    """
+
+    first = results[0]
+    for file_name, result in zip(files, results):
+        if list(result['names']) != list(first['names']):
+            raise Exception('Other extraction definitions in {}'.format(file_name))
+        if result['TH'].shape != first['TH'].shape:
+            raise Exception('Other number of samples in {}: {} instead of {}'.format(
+                file_name, result['TH'].shape[1], first['TH'].shape[1]))
+
+    return {
+        'files': np.array(files),
+        'names': first['names'],
+        'units': first['units'],
+        'stat_names': first['stat_names'],
+        'time': first['time'],
+        'TH': np.stack([result['TH'] for result in results]),
+        'stats': np.stack([result['stats'] for result in results]),
+    }
+
+
+def ExtractSeries(folder, extraction_data, time_defs, n_workers=1, threads=False, timeout=None, retries=0):
+    """
+    Function extracts all .sim files of a series folder (also in sub folders) in parallel and
+    returns the merged results (see MergeResults) and the files that could not be extracted
+
+    Parameters
+    ----------
+    folder : str
+    extraction_data : dict
+        GenVariableName: [OrcFxVariableName, object_name, objectExtra]
+    time_defs : list
+        [t_start_res, t_end_res]
+    n_workers : int
+        number of worker processes (or threads), e.g. the number of cores or OrcaFlex licences
+    threads : bool
+        extract in threads of this process instead of worker processes
+    timeout : float
+        wall-clock timeout per file in seconds (worker processes only), None for no timeout
+    retries : int
+        number of retries of a file that failed
+
+    Returns
+    -------
+    series : dict
+        merged results, None if no file was extracted
+    failed : dict
+        file path: error
+    """
+
+    sim_files, sim_file_folders_list, prefix = ff.list_simfiles(folder)
+    paths = [os.path.join(path, sim_file) for sim_file, path in zip(sim_files, sim_file_folders_list)]
+
+    results = {}
+    failed = {}
+
+    def on_done(path, result):
+        results[path] = result
+        print('Extracted: ', path)
+
+    def on_failed(path, details, final):
+        if final:
+            failed[path] = details['error']
+        print('Failed: ', path, ' ', details['error'])
+
+    Pool = pp.ThreadPool if threads else pp.WorkerPool
+    pool = Pool(max(1, min(n_workers, len(paths))), retries, backoff=1.0)
+    pool.run([[path, ExtractSimFile, (path, extraction_data, time_defs), timeout] for path in paths],
+             on_done, on_failed)
+
+    done = [i for i, path in enumerate(paths) if path in results]
+    if not done:
+        return None, failed
+
+    return MergeResults([os.path.relpath(paths[i], folder) for i in done], [results[paths[i]] for i in done]), failed
+
+
+def SaveSeries(file_path, series):
+    """
+    Function saves a series to a .npz file
+    """
+
+    np.savez(file_path, **series)
+
+
+def LoadSeries(file_path):
+    """
+    Function returns a series saved with SaveSeries as a dict of arrays
+    """
+
+    with np.load(file_path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='python -m stephan_py.series',
+                                     description='Extract all .sim files of a series folder in parallel into <prefix>' + SERIES_SUFFIX)
+    parser.add_argument('folder', nargs='?', default=os.getcwd())
+    parser.add_argument('--extract', required=True, metavar='DEFS_JSON', help='extraction definitions (e.g. extraction_defs.json)')
+    parser.add_argument('--period', nargs=2, type=float, default=[0.0, 600.0], metavar=('T_START', 'T_END'), help='extraction period [s]')
+    parser.add_argument('--workers', default='auto', help="number of worker processes (e.g. the number of OrcaFlex licences) or 'auto' (from cores and available memory)")
+    parser.add_argument('--memory-per-worker', type=float, default=2.0, metavar='GB', help="memory needed per worker for --workers auto [GB], about the size of a loaded .sim file")
+    parser.add_argument('--threads', action='store_true', help='extract in threads of this process instead of worker processes')
+    parser.add_argument('--timeout', type=float, help='wall-clock timeout per file in seconds')
+    parser.add_argument('--retries', type=int, default=0, help='number of retries of a file that failed')
+    parser.add_argument('--output', help='series result file (default <folder>/<prefix>' + SERIES_SUFFIX + ')')
+    parser.add_argument('--store', nargs='?', const='', metavar='STORE_FOLDER',
+                        help='write the columnar result store instead (default <folder>/<prefix>' + st.STORE_SUFFIX + ')')
+    args = parser.parse_args(argv)
+
+    folder = os.path.abspath(args.folder)
+    n_files = len(ff.list_simfiles(folder)[0])
+    n_workers = sc.AutoWorkers(n_files, args.memory_per_worker) if args.workers == 'auto' else int(args.workers)
+    print(n_files, ' .sim files, ', n_workers, ' workers')
+
+    series, failed = ExtractSeries(folder, ex.LoadExtractionDefs(args.extract), args.period, n_workers,
+                                   args.threads, args.timeout, args.retries)
+
+    if failed:
+        print(len(failed), ' files failed:')
+        for path, error in failed.items():
+            print('  ', path, ' ', error)
+
+    if series is not None and args.store is not None:
+        store_path = args.store if args.store else StorePath(folder)
+        st.WriteStore(store_path, series, {'folder': folder, 'period': args.period})
+        print('Stored ', len(series['files']), ' files in ', store_path)
+    elif series is not None:
+        output = args.output if args.output is not None else SeriesPath(folder)
+        SaveSeries(output, series)
+        print('Saved ', len(series['files']), ' files to ', output)
+
+
+if __name__ == '__main__':
+    main()
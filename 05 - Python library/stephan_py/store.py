@@ -0,0 +1,195 @@
+"""
+This module contains the columnar result store of a series, a folder of .npy arrays that
+replaces the per-variable statistics CSVs and the _TH.csv files
+
+    <prefix>_store/
+        store.json          names, units, stat_names, dtype and the metadata of every case
+        time.npy            sample times [s]
+        stats.npy           statistics, cases x channels x stat_names (float64)
+        channel_<i>.npy     time histories of channel i, cases x samples (float32)
+
+Every channel is one file, so loading a few channels of a few cases only reads those from
+disk (the arrays are memory mapped). The case metadata (wind speed, seed, Hs, Tp and
+controller variant) is taken from the case file names, see CaseMetadata.
+"""
+import os
+import re
+import glob
+import json
+import numpy as np
+import pandas as pd
+
+from . import schedule
+from . import selection
+
+# Store folder of a series, <prefix>_store
+STORE_SUFFIX = '_store'
+
+# Description of the store, in the store folder
+STORE_NAME = 'store.json'
+
+
+def CaseMetadata(file_name):
+    """
+    Function returns the metadata of a load case from its file name, e.g.
+    '00001_s1(IPC)_w(Irreg_DIR000_Hs6.3_Tp11.5_U04_SEED10001)_W(NTM_U4.0_SEED10001).sim'
+
+    Returns
+    -------
+    dict
+        file, name, index, wind_speed [m/s], seed, Hs [m], Tp [s] (None when unknown),
+        variant (controller variant, e.g. 'IPC', '' for the base controller) and individual (IPC)
+    """
+
+    base_name = os.path.basename(file_name)
+    fields = selection.CaseFields(base_name)
+
+    wave = {}
+    for key in ['Hs', 'Tp']:
+        match = re.search(key + r'(\d+(?:\.\d+)?)', base_name)
+        wave[key] = float(match.group(1)) if match else None
+
+    match = re.search(r'_s\d+\(([^)]*)\)', base_name)
+
+    return {'file': file_name, 'name': fields['name'], 'index': fields['index'],
+            'wind_speed': fields['wind_speed'], 'seed': fields['seed'], 'Hs': wave['Hs'], 'Tp': wave['Tp'],
+            'variant': match.group(1) if match else '',
+            'individual': schedule.CaseParameters(base_name)['individual']}
+
+
+def WriteStore(store_path, series, metadata=None):
+    """
+    Function writes a series (see series.MergeResults) to a store folder
+
+    Parameters
+    ----------
+    store_path : str
+        store folder, created if it does not exist
+    series : dict
+        files, names, units, stat_names, time, TH (files x variables x samples) and stats
+    metadata : dict
+        metadata of the series (e.g. the series folder), saved in store.json
+    """
+
+    os.makedirs(store_path, exist_ok=True)
+
+    # channels of an earlier write, which may have had more channels
+    for channel_path in glob.glob(os.path.join(store_path, 'channel_*.npy')):
+        os.remove(channel_path)
+
+    np.save(os.path.join(store_path, 'time.npy'), np.asarray(series['time'], dtype=np.float64))
+    np.save(os.path.join(store_path, 'stats.npy'), np.asarray(series['stats'], dtype=np.float64))
+
+    TH = series['TH']
+    for i in range(TH.shape[1]):
+        np.save(os.path.join(store_path, 'channel_{}.npy'.format(i)), np.ascontiguousarray(TH[:, i, :]))
+
+    description = {
+        'names': [str(name) for name in series['names']],
+        'units': [str(unit) for unit in series['units']],
+        'stat_names': [str(stat_name) for stat_name in series['stat_names']],
+        'dtype': str(TH.dtype),
+        'cases': [CaseMetadata(str(file_name)) for file_name in series['files']],
+        'metadata': metadata if metadata is not None else {},
+    }
+    with open(os.path.join(store_path, STORE_NAME), 'w') as f:
+        json.dump(description, f, indent=2)
+
+
+def ReadStore(store_path):
+    """
+    Function returns the description of a store (the content of store.json)
+    """
+
+    with open(os.path.join(store_path, STORE_NAME)) as f:
+        return json.load(f)
+
+
+def _CaseIndices(description, cases):
+
+    # Indices of the selected cases: all (None), a selection string (see selection) or indices
+    if cases is None:
+        return list(range(len(description['cases'])))
+
+    if isinstance(cases, str):
+        terms = selection.ParseSelection(cases)
+        return [i for i, case in enumerate(description['cases'])
+                if selection.Selected(terms, os.path.basename(case['file']))]
+
+    return list(cases)
+
+
+def _ChannelIndices(description, channels):
+
+    # Indices of the selected channels: all (None) or names
+    if channels is None:
+        return list(range(len(description['names'])))
+
+    if isinstance(channels, str):
+        channels = [channels]
+
+    missing = [channel for channel in channels if channel not in description['names']]
+    if missing:
+        raise Exception('Not in the store: {}'.format(', '.join(missing)))
+
+    return [description['names'].index(channel) for channel in channels]
+
+
+def LoadChannels(store_path, channels=None, cases=None):
+    """
+    Function loads time histories of selected channels and cases from a store
+
+    Parameters
+    ----------
+    store_path : str
+    channels : list or str
+        channel names, None for all channels
+    cases : str or list
+        selection string (see selection), case indices, or None for all cases
+
+    Returns
+    -------
+    dict
+        names, units, time, cases (metadata) and TH (cases x channels x samples)
+    """
+
+    description = ReadStore(store_path)
+    case_indices = _CaseIndices(description, cases)
+    channel_indices = _ChannelIndices(description, channels)
+
+    time = np.load(os.path.join(store_path, 'time.npy'))
+    TH = np.empty((len(case_indices), len(channel_indices), len(time)), dtype=description['dtype'])
+    for j, channel_index in enumerate(channel_indices):
+        values = np.load(os.path.join(store_path, 'channel_{}.npy'.format(channel_index)), mmap_mode='r')
+        TH[:, j, :] = values[case_indices]
+
+    return {
+        'names': [description['names'][i] for i in channel_indices],
+        'units': [description['units'][i] for i in channel_indices],
+        'time': time,
+        'cases': [description['cases'][i] for i in case_indices],
+        'TH': TH,
+    }
+
+
+def StatsFrame(store_path, channel, cases=None):
+    """
+    Function returns the statistics of a channel as a dataframe with the columns of the
+    prefix_[Var].csv files (Sim-file and the stat names) followed by the case metadata, the
+    unit is in the attrs of the dataframe
+    """
+
+    description = ReadStore(store_path)
+    case_indices = _CaseIndices(description, cases)
+    channel_index = _ChannelIndices(description, channel)[0]
+
+    stats = np.load(os.path.join(store_path, 'stats.npy'), mmap_mode='r')[case_indices, channel_index, :]
+
+    df = pd.DataFrame({'Sim-file': [os.path.basename(description['cases'][i]['file']) for i in case_indices]})
+    for k, stat_name in enumerate(description['stat_names']):
+        df[stat_name] = stats[:, k]
+    for key in ['wind_speed', 'seed', 'Hs', 'Tp', 'variant', 'individual']:
+        df[key] = [description['cases'][i][key] for i in case_indices]
+    df.attrs['unit'] = description['units'][channel_index]
+
+    return df
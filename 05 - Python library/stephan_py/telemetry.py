@@ -0,0 +1,204 @@
+"""
+This module contains the per-job telemetry of the batch runner and the throughput report
+"""
+import os
+import sys
+import json
+import time
+import socket
+import ctypes
+import numpy as np
+
+# JSON-lines file with one event per finished or failed job, written in the main folder of a batch
+TELEMETRY_NAME = 'RunOrcFxMult_telemetry.jsonl'
+
+# Timing counters of the controller wrapper, written next to the model at the end of a simulation
+# when the turbine has the tag ProfileController = True (BladedControllerWrapper_20210627.py)
+CONTROLLER_PROFILE_SUFFIX = '_ControllerProfile.json'
+
+# Phases of the controller wrapper profile, in the order of the report
+CONTROLLER_PHASES = ['inputs', 'time_history', 'dll', 'outputs', 'debug']
+
+
+def PeakRSS():
+    """
+    Function returns the peak resident memory of this process in bytes, or None if unknown.
+    Worker processes run several jobs, so this is the peak over all jobs run so far.
+    """
+
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return rss if sys.platform == 'darwin' else rss * 1024
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        pass
+
+    if os.name == 'nt':
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+
+    return None
+
+
+class JobTimer(object):
+    """
+    Collects the telemetry event of one job in a worker process.
+
+    Call lap() after each phase ('load_time', 'solve_time', 'extract_time', 'save_time')
+    and finish() at the end; the event is then a JSON serialisable dict.
+    """
+
+    def __init__(self):
+        self.t = time.time()
+        self.event = {'host': socket.gethostname(), 'pid': os.getpid(), 'start': self.t,
+                      'load_time': 0.0, 'solve_time': 0.0, 'extract_time': 0.0, 'save_time': 0.0}
+
+    def lap(self, name):
+        now = time.time()
+        self.event[name] = self.event.get(name, 0.0) + now - self.t
+        self.t = now
+
+    def finish(self, model=None, status='done'):
+        self.event['end'] = time.time()
+        self.event['wall_time'] = self.event['end'] - self.event['start']
+        self.event['status'] = status
+        self.event['peak_rss'] = PeakRSS()
+
+        # Simulated seconds per wall clock second of the solver
+        self.event['sim_time'] = None
+        self.event['sim_speed'] = None
+        if model is not None:
+            try:
+                self.event['sim_time'] = model.simulationStopTime - model.simulationStartTime
+            except Exception:
+                pass
+        if self.event['sim_time'] is not None and self.event['solve_time'] > 0.0:
+            self.event['sim_speed'] = self.event['sim_time'] / self.event['solve_time']
+
+        return self.event
+
+
+def ReadControllerProfile(model_path, since=None):
+    """
+    Function returns the controller wrapper profile of a model (.dat path) as a dict, or None if
+    there is none or it was written before the time since (e.g. by an earlier run of the case)
+    """
+
+    file_path = os.path.splitext(model_path)[0] + CONTROLLER_PROFILE_SUFFIX
+    if not os.path.isfile(file_path) or (since is not None and os.path.getmtime(file_path) < since):
+        return None
+
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def NewRunId():
+    """
+    Function returns the id of a run of the batch runner, written into all its events so the
+    runs appended to one telemetry file can be told apart
+    """
+
+    return '{}_{}_{}'.format(time.strftime('%Y%m%d-%H%M%S'), socket.gethostname(), os.getpid())
+
+
+def WriteEvent(file_path, event):
+    """
+    Function appends one event to a telemetry file
+    """
+
+    with open(file_path, 'a') as f:
+        f.write(json.dumps(event) + '\n')
+
+
+def ReadEvents(file_path):
+    """
+    Function returns all events of a telemetry file as a list of dicts
+    """
+
+    events = []
+    with open(file_path) as f:
+        for line in f:
+            if line.strip():
+                events.append(json.loads(line))
+
+    return events
+
+
+def _Mean(values):
+
+    values = [v for v in values if v is not None]
+    return float(np.mean(values)) if values else float('nan')
+
+
+def Report(events, n_slowest=5):
+    """
+    Function returns a throughput report of telemetry events, grouped per batch folder and run
+    of the batch runner (events written before runs had an id are one run). Jobs that failed
+    for good (quarantined) count as failed, failed attempts that were retried as retries.
+    """
+
+    batches = {}
+    for event in events:
+        batches.setdefault((event.get('batch', ''), event.get('run') or ''), []).append(event)
+
+    lines = []
+    for (batch, run), batch_events in sorted(batches.items()):
+
+        done = [e for e in batch_events if e.get('status') == 'done']
+        retries = [e for e in batch_events if e.get('status') == 'retry']
+        failed = [e for e in batch_events if e.get('status') not in ('done', 'retry')]
+
+        starts = [e['start'] for e in batch_events if e.get('start') is not None]
+        ends = [e['end'] for e in batch_events if e.get('end') is not None]
+        makespan = max(ends) - min(starts) if starts and ends else float('nan')
+        hosts = sorted(set(e.get('host') for e in batch_events))
+        peak_rss = [e['peak_rss'] for e in batch_events if e.get('peak_rss') is not None]
+
+        lines.append(batch + ('  (run {})'.format(run) if run else ''))
+        lines.append('  Jobs: {} done, {} failed, {} retries, hosts: {}'.format(len(done), len(failed), len(retries), ', '.join(hosts)))
+        lines.append('  Makespan: {:.0f} s, throughput: {:.1f} jobs/h'.format(makespan, len(done) / makespan * 3600. if makespan > 0 else float('nan')))
+        lines.append('  Mean times [s]: wall {:.1f}, load {:.1f}, solve {:.1f}, extract {:.1f}, save {:.1f}'.format(
+            _Mean([e.get('wall_time') for e in done]), _Mean([e.get('load_time') for e in done]),
+            _Mean([e.get('solve_time') for e in done]), _Mean([e.get('extract_time') for e in done]),
+            _Mean([e.get('save_time') for e in done])))
+        lines.append('  Mean simulated s per wall s: {:.2f}'.format(_Mean([e.get('sim_speed') for e in done])))
+        if peak_rss:
+            lines.append('  Peak RSS: {:.2f} GB'.format(max(peak_rss) / 1024.**3))
+
+        # Controller wrapper profiles (ProfileController tag), share of the solve time of the same jobs
+        profiled = [e for e in done if e.get('controller') is not None]
+        if profiled:
+            wrapper_time = sum(e['controller']['wrapper_time'] for e in profiled)
+            solve_time = sum(e['solve_time'] for e in profiled)
+            lines.append('  Controller wrapper: {} jobs profiled, {:.1f} % of the solve time'.format(
+                len(profiled), 100. * wrapper_time / solve_time if solve_time > 0 else float('nan')))
+            lines.append('    Mean times [s]: ' + ', '.join('{} {:.1f}'.format(
+                name, _Mean([e['controller'][name + '_time'] for e in profiled])) for name in CONTROLLER_PHASES))
+            lines.append('    Mean per controller call [us]: {:.1f}'.format(
+                1e6 * _Mean([e['controller']['wrapper_time'] / e['controller']['calls']
+                             for e in profiled if e['controller']['calls']])))
+
+        lines.append('  Slowest jobs:')
+        for e in sorted(done, key=lambda e: -e['wall_time'])[:n_slowest]:
+            lines.append('    {:8.1f} s  {}'.format(e['wall_time'], e.get('job')))
+        for e in failed:
+            lines.append('    failed     {}  {}'.format(e.get('job'), e.get('error')))
+
+    return '\n'.join(lines)
+